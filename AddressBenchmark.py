@@ -0,0 +1,355 @@
+"""
+AddressBenchmark measures the throughput, latency and memory use of
+AddressFormat on reproducible synthetic addresses, and reports them
+as JSON so that runs can be compared.
+
+    python -m AddressBenchmark -n 100000 --seed 1 -o before.json
+"""
+
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+from timeit import default_timer
+
+import AddressFormat
+
+STREET_NAMES = ('MAIN', 'OAK', 'PARK', 'MAPLE', 'WASHINGTON', 'LAKE', 'HILL',
+                'PINE', 'CEDAR', 'ELM', 'SAINT JAMES', 'MARTIN LUTHER KING',
+                'CHURCH', 'HIGH', 'MILL', 'SPRING', 'RIVER', '1ST', '22ND')
+CITY_NAMES = ('SPRINGFIELD', 'CHICAGO', 'SANTA FE', 'ST LOUIS', 'PORTLAND',
+              'SALT LAKE CITY', 'FRANKLIN', 'GREENVILLE', 'NEW YORK',
+              'KANSAS CITY', 'VIRGINIA BEACH', 'FAIRVIEW', 'MADISON')
+
+def generate_addresses(count, seed = 0, bad_zip_rate = 0.02,
+                       state_name_rate = 0.2, misspelling_rate = 0.05,
+                       missing_divider_rate = 0.3):
+    '''Yields count synthetic addresses as (delivery address, last
+    line) pairs, the same for the same seed. Directionals,
+    suffixes, unit designators and states are drawn from the
+    AddressFormat tables in names and abbreviations, in mixed case,
+    with zip codes served in the state where it has any. The rates
+    give the chance of a bad zip code, of a state given by its full
+    name, of a misspelled suffix or state and of a last line
+    without a comma between the city and state.'''
+    generator = random.Random(seed)
+    random_value = generator.random
+    choice = generator.choice
+    directionals = sorted(AddressFormat.DIRECTIONAL_LOOKUP)
+    suffixes = sorted(AddressFormat.STREET_ABBREVIATIONS)
+    designators = sorted(AddressFormat.UNIT_LOOKUP)
+    state_names = sorted(AddressFormat.STATE_NAME_INDEX)
+    state_codes = sorted(AddressFormat.STATE_CODES)
+    state_zip3s = {}
+    for zip3, states in enumerate(AddressFormat.ZIP3_STATES):
+        for state in states or ():
+            state_zip3s.setdefault(state, []).append(zip3)
+    for i in xrange(count):
+        delivery_address = [str(generator.randint(1, 99999))]
+        if random_value() < 0.2:
+            delivery_address.append(choice(directionals))
+        delivery_address.append(choice(STREET_NAMES))
+        suffix = choice(suffixes)
+        if random_value() < misspelling_rate:
+            suffix = _misspell(generator, suffix)
+        delivery_address.append(suffix)
+        if random_value() < 0.1:
+            delivery_address.append(choice(directionals))
+        if random_value() < 0.25:
+            delivery_address.append(choice(designators))
+            delivery_address.append(str(generator.randint(1, 999)))
+        if random_value() < state_name_rate:
+            state = choice(state_names)
+        else:
+            state = choice(state_codes)
+        zip3s = state_zip3s.get(AddressFormat.STATE_NAME_INDEX.get(state,
+                                                                   state))
+        if random_value() < misspelling_rate:
+            state = _misspell(generator, state)
+        if random_value() < bad_zip_rate:
+            zip = str(generator.randint(0, 9999))
+        elif zip3s:
+            zip = '%03d%02d' % (choice(zip3s), generator.randint(0, 99))
+        else:
+            zip = '%05d' % generator.randint(501, 99950)
+            if random_value() < 0.2:
+                zip += '-%04d' % generator.randint(0, 9999)
+        if random_value() < missing_divider_rate:
+            divider = ' '
+        else:
+            divider = ', '
+        last_line = choice(CITY_NAMES) + divider + state + ' ' + zip
+        yield (_mix_case(generator, ' '.join(delivery_address)),
+               _mix_case(generator, last_line))
+
+def _misspell(generator, word):
+    '''Drops, doubles or swaps a letter of the word.'''
+    if len(word) < 3:
+        return word
+    i = generator.randint(1, len(word) - 2)
+    mistake = generator.randint(0, 2)
+    if mistake == 0:
+        return word[:i] + word[i + 1:]
+    if mistake == 1:
+        return word[:i] + word[i] + word[i:]
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+def _mix_case(generator, text):
+    mix = generator.random()
+    if mix < 0.6:
+        return text
+    if mix < 0.8:
+        return text.lower()
+    return text.title()
+
+def _address(record):
+    return record[0] + ', ' + record[1]
+
+def _last_line_divider(last_line):
+    if ',' in last_line:
+        return ','
+    return ''
+
+def _peak_rss_kb(who = resource.RUSAGE_SELF):
+    return resource.getrusage(who).ru_maxrss
+
+def _warm_up(records):
+    '''Standardizes the first record untimed, so that building the
+    tables and the first calls are not counted in the timings.'''
+    for result in AddressFormat.standardize_many(
+            [_address(record) for record in records[:1]]):
+        pass
+
+def _time_calls(function, arguments):
+    '''Calls function on each tuple of arguments, returning the
+    latency of each call in seconds and the number of calls which
+    raised a ValueError. The first call is made once untimed
+    beforehand to warm up.'''
+    latencies = []
+    append = latencies.append
+    errors = 0
+    for args in arguments[:1]:
+        try:
+            function(*args)
+        except ValueError:
+            pass
+    for args in arguments:
+        start = default_timer()
+        try:
+            function(*args)
+        except ValueError:
+            errors += 1
+        append(default_timer() - start)
+    return latencies, errors
+
+def _bench_standardize(records, options):
+    return _time_calls(AddressFormat.standardize,
+                       [(_address(record),) for record in records])
+
+def _bench_breakdown(records, options):
+    return _time_calls(AddressFormat.breakdown,
+                       [(_address(record),) for record in records])
+
+def _bench_delivery_address_standardize(records, options):
+    return _time_calls(AddressFormat.delivery_address_standardize,
+                       [(record[0],) for record in records])
+
+def _bench_last_line_standardize(records, options):
+    return _time_calls(AddressFormat.last_line_standardize,
+                       [(record[1], _last_line_divider(record[1]))
+                        for record in records])
+
+def _bench_standardize_many(records, options):
+    '''Times each record as it is yielded, after warming up.'''
+    _warm_up(records)
+    latencies = []
+    append = latencies.append
+    errors = 0
+    results = AddressFormat.standardize_many(_address(record)
+                                             for record in records)
+    start = default_timer()
+    for result in results:
+        end = default_timer()
+        append(end - start)
+        if result is None:
+            errors += 1
+        start = end
+    return latencies, errors
+
+def _bench_standardize_column(records, options):
+    '''Times the whole column of last lines only, after warming up,
+    so no per record latency is given.'''
+    _warm_up(records)
+    column = [record[1] for record in records]
+    start = default_timer()
+    results, masks = AddressFormat.standardize_column(column)
+    elapsed = default_timer() - start
+    unparseable = AddressFormat.ISSUE_BITS[AddressFormat.UNPARSEABLE]
+    return elapsed, sum(1 for mask in masks if mask & unparseable)
+
+def _bench_validate(records, options):
+    return _time_calls(AddressFormat.validate,
+                       [(_address(record),) for record in records])
+
+def _bench_validate_many(records, options):
+    '''Times each record as it is yielded, after warming up, counting
+    those found unparseable as errors.'''
+    _warm_up(records)
+    unparseable = AddressFormat.ISSUE_BITS[AddressFormat.UNPARSEABLE]
+    latencies = []
+    append = latencies.append
+    errors = 0
+    masks = AddressFormat.validate_many(_address(record)
+                                        for record in records)
+    start = default_timer()
+    for mask in masks:
+        end = default_timer()
+        append(end - start)
+        if mask & unparseable:
+            errors += 1
+        start = end
+    return latencies, errors
+
+def _bench_standardize_file(records, options):
+    '''Times the whole file only, so no per record latency is given.
+    The tables are warmed up in this process, which the workers
+    share.'''
+    _warm_up(records)
+    input = tempfile.TemporaryFile()
+    for record in records:
+        input.write(_address(record) + '\n')
+    input.seek(0)
+    with open(os.devnull, 'w') as output:
+        start = default_timer()
+        count, errors = AddressFormat.standardize_file(input, output,
+                workers = options['workers'],
+                chunk_size = options['chunk_size'],
+                cache_size = options['cache_size'])
+        elapsed = default_timer() - start
+    input.close()
+    return elapsed, errors
+
+BENCHMARKS = {'standardize': _bench_standardize,
+              'breakdown': _bench_breakdown,
+              'delivery_address_standardize':
+                  _bench_delivery_address_standardize,
+              'last_line_standardize': _bench_last_line_standardize,
+              'standardize_many': _bench_standardize_many,
+              'standardize_column': _bench_standardize_column,
+              'standardize_file': _bench_standardize_file,
+              'validate': _bench_validate,
+              'validate_many': _bench_validate_many}
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def run_benchmark(name, options):
+    '''Runs one benchmark in this process on freshly generated
+    addresses, returning its measurements as a dict.'''
+    records = list(generate_addresses(options['count'], options['seed'],
+            options['bad_zip_rate'], options['state_name_rate'],
+            options['misspelling_rate'], options['missing_divider_rate']))
+    if options['cache_size'] and name != 'standardize_file':
+        AddressFormat.set_cache(AddressFormat.LRUCache(options['cache_size']))
+    baseline_rss = _peak_rss_kb()
+    latencies, errors = BENCHMARKS[name](records, options)
+    result = {'records': len(records), 'errors': errors,
+              'peak_rss_kb': _peak_rss_kb(),
+              'rss_growth_kb': _peak_rss_kb() - baseline_rss,
+              'children_peak_rss_kb': _peak_rss_kb(
+                      resource.RUSAGE_CHILDREN)}
+    if isinstance(latencies, float):
+        elapsed = latencies
+        result['p50_us'] = result['p99_us'] = None
+    else:
+        elapsed = sum(latencies)
+        latencies.sort()
+        if latencies:
+            result['p50_us'] = _percentile(latencies, 0.5) * 1e6
+            result['p99_us'] = _percentile(latencies, 0.99) * 1e6
+    result['seconds'] = elapsed
+    result['records_per_sec'] = len(records) / elapsed if elapsed else None
+    cache = AddressFormat.get_cache()
+    if cache is not None:
+        result['cache'] = cache.stats()
+    return result
+
+def _run_child(queue, name, options):
+    try:
+        queue.put((False, run_benchmark(name, options)))
+    except Exception, error:
+        queue.put((True, repr(error)))
+
+def run(names = None, count = 100000, seed = 0, workers = None,
+        chunk_size = 1000, cache_size = 0, bad_zip_rate = 0.02,
+        state_name_rate = 0.2, misspelling_rate = 0.05,
+        missing_divider_rate = 0.3):
+    '''Runs the named benchmarks, or all of them, each in a fresh
+    process so that their peak memory is measured separately, and
+    returns a report of the options and results.'''
+    options = {'count': count, 'seed': seed,
+               'workers': workers or multiprocessing.cpu_count(),
+               'chunk_size': chunk_size, 'cache_size': cache_size,
+               'bad_zip_rate': bad_zip_rate,
+               'state_name_rate': state_name_rate,
+               'misspelling_rate': misspelling_rate,
+               'missing_divider_rate': missing_divider_rate}
+    results = {}
+    for name in names or sorted(BENCHMARKS):
+        if name not in BENCHMARKS:
+            raise ValueError("Unknown benchmark: "+name)
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target = _run_child,
+                                          args = (queue, name, options))
+        process.start()
+        failed, result = queue.get()
+        process.join()
+        if failed:
+            raise RuntimeError("Benchmark %s failed: %s" % (name, result))
+        results[name] = result
+    return {'version': AddressFormat.__version__,
+            'python': sys.version.split()[0],
+            'options': options,
+            'results': results}
+
+def main(argv = None):
+    '''Command line entry point, run as python -m AddressBenchmark.'''
+    import argparse
+    parser = argparse.ArgumentParser(prog = "python -m AddressBenchmark",
+            description = "Benchmark AddressFormat on synthetic addresses "
+                          "and write the results as JSON.")
+    parser.add_argument("benchmarks", nargs = "*", metavar = "benchmark",
+            help = "benchmarks to run, all by default: " +
+                   ", ".join(sorted(BENCHMARKS)))
+    parser.add_argument("-n", "--count", type = int, default = 100000,
+            help = "number of addresses")
+    parser.add_argument("-s", "--seed", type = int, default = 0)
+    parser.add_argument("-j", "--workers", type = int,
+            help = "worker processes for standardize_file")
+    parser.add_argument("--chunk-size", type = int, default = 1000)
+    parser.add_argument("--cache-size", type = int, default = 0)
+    parser.add_argument("--bad-zip-rate", type = float, default = 0.02)
+    parser.add_argument("--state-name-rate", type = float, default = 0.2)
+    parser.add_argument("--misspelling-rate", type = float, default = 0.05)
+    parser.add_argument("--missing-divider-rate", type = float,
+            default = 0.3)
+    parser.add_argument("-o", "--output", default = "-",
+            help = "file to write the JSON report to")
+    args = parser.parse_args(argv)
+    report = run(args.benchmarks, args.count, args.seed, args.workers,
+                 args.chunk_size, args.cache_size, args.bad_zip_rate,
+                 args.state_name_rate, args.misspelling_rate,
+                 args.missing_divider_rate)
+    text = json.dumps(report, indent = 2, sort_keys = True)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
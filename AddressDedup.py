@@ -0,0 +1,179 @@
+"""
+AddressDedup finds duplicate addresses among more records than fit in
+memory, by grouping them on a compact canonical key of their standardized
+parts with an external sort.
+
+    python -m AddressDedup addresses.txt -o clusters.txt
+"""
+
+import hashlib
+import heapq
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from itertools import groupby
+
+import AddressFormat
+
+KEY_SIZE = 8
+_KEY_ROW = struct.Struct('>%dsQ' % KEY_SIZE)
+_ROW_CLUSTER = struct.Struct('>QQ')
+
+def canonical_key(parsed):
+    '''Returns a KEY_SIZE byte digest of the parts of a ParsedAddress
+    which identify its delivery point: the primary number,
+    directionals, street name, suffix, unit and zip5. The unit
+    designator is left out, so that "APT 4" and "# 4" match.'''
+    parts = parsed[:5] + (parsed.unit, parsed.zip5)
+    return hashlib.md5('|'.join([part or '' for part in parts])).digest()[
+            :KEY_SIZE]
+
+def cluster_ids(addresses, delimiter = "", max_records = 1000000,
+                directory = None, fan_in = 64):
+    '''Takes any iterable of raw addresses, including an open file,
+    and yields for each one in input order the index of the first
+    address with the same canonical key, so that duplicates share a
+    cluster id. An address which cannot be standardized is a cluster
+    of its own. At most max_records rows are held in memory; beyond
+    that they are written in sorted runs to temporary files under
+    directory, which are merged fan_in at a time and removed once
+    the last id has been yielded.'''
+    work = tempfile.mkdtemp(prefix = 'AddressDedup', dir = directory)
+    try:
+        key_runs, unparsed_run = _spill_keys(addresses, delimiter,
+                                             max_records, work)
+        clusters = _assign_clusters(
+                _merge_runs(key_runs, _KEY_ROW, work, fan_in), max_records,
+                work)
+        for row, cluster in _merge_runs(clusters + [unparsed_run],
+                                        _ROW_CLUSTER, work, fan_in):
+            yield cluster
+    finally:
+        shutil.rmtree(work, ignore_errors = True)
+
+def _spill_keys(addresses, delimiter, max_records, directory):
+    '''Groups the rows of the addresses by canonical key in a dict
+    which is written out as a run sorted by key whenever it holds
+    max_records rows. Returns the paths of the runs, and of a run of
+    the rows which could not be standardized.'''
+    breakdown = AddressFormat.breakdown
+    table, held, runs = {}, 0, []
+    unparsed_handle, unparsed_run = tempfile.mkstemp(dir = directory,
+                                                     suffix = '.run')
+    with os.fdopen(unparsed_handle, 'wb') as unparsed:
+        for row, address in enumerate(addresses):
+            try:
+                key = canonical_key(breakdown(address.rstrip('\r\n'),
+                                              delimiter))
+            except ValueError:
+                unparsed.write(_ROW_CLUSTER.pack(row, row))
+                continue
+            table.setdefault(key, []).append(row)
+            held += 1
+            if held >= max_records:
+                runs.append(_write_run(_table_records(table), _KEY_ROW,
+                                       directory))
+                table, held = {}, 0
+    if table:
+        runs.append(_write_run(_table_records(table), _KEY_ROW, directory))
+    return runs, unparsed_run
+
+def _table_records(table):
+    for key in sorted(table):
+        for row in table[key]:
+            yield key, row
+
+def _assign_clusters(records, max_records, directory):
+    '''Gives every row of each group of records sharing a key the
+    first row of the group as its cluster, and writes the rows and
+    clusters out in runs sorted by row, returning their paths.'''
+    buffer, runs = [], []
+    for key, group in groupby(records, lambda record: record[0]):
+        cluster = None
+        for key, row in group:
+            if cluster is None:
+                cluster = row
+            buffer.append((row, cluster))
+        if len(buffer) >= max_records:
+            buffer.sort()
+            runs.append(_write_run(buffer, _ROW_CLUSTER, directory))
+            buffer = []
+    if buffer:
+        buffer.sort()
+        runs.append(_write_run(buffer, _ROW_CLUSTER, directory))
+    return runs
+
+def _write_run(records, record_struct, directory):
+    handle, path = tempfile.mkstemp(dir = directory, suffix = '.run')
+    pack = record_struct.pack
+    with os.fdopen(handle, 'wb') as run:
+        for record in records:
+            run.write(pack(*record))
+    return path
+
+def _read_run(path, record_struct, block_records = 4096):
+    '''Yields the records of a run, reading it in blocks, and removes
+    it once it has been read.'''
+    size, unpack = record_struct.size, record_struct.unpack_from
+    with open(path, 'rb') as run:
+        while True:
+            block = run.read(size * block_records)
+            if not block:
+                break
+            for offset in xrange(0, len(block), size):
+                yield unpack(block, offset)
+    os.remove(path)
+
+def _merge_runs(paths, record_struct, directory, fan_in):
+    '''Merges sorted runs into one sorted stream of records, first
+    merging them fan_in at a time into longer runs until no more
+    than fan_in remain, so that few files are open at once.'''
+    while len(paths) > fan_in:
+        paths = [_write_run(heapq.merge(*[_read_run(path, record_struct)
+                                          for path in paths[i:i + fan_in]]),
+                            record_struct, directory)
+                 for i in xrange(0, len(paths), fan_in)]
+    return heapq.merge(*[_read_run(path, record_struct) for path in paths])
+
+def main(argv = None):
+    '''Command line entry point, run as python -m AddressDedup.'''
+    import argparse
+    parser = argparse.ArgumentParser(prog = "python -m AddressDedup",
+            description = "Write the cluster id of each address in a file "
+                          "of one address per line, duplicates sharing "
+                          "the id of their first occurrence.")
+    parser.add_argument("input", nargs = "?", default = "-",
+            help = "file of addresses, or - for standard input")
+    parser.add_argument("-o", "--output", default = "-",
+            help = "file to write to, or - for standard output")
+    parser.add_argument("-d", "--delimiter", default = "",
+            help = "delimiter between the street and city")
+    parser.add_argument("-m", "--max-records", type = int, default = 1000000,
+            help = "rows held in memory before spilling to disk")
+    parser.add_argument("-t", "--temp-dir",
+            help = "directory for the sorted runs")
+    parser.add_argument("--fan-in", type = int, default = 64,
+            help = "runs merged at once")
+    args = parser.parse_args(argv)
+    input = sys.stdin if args.input == "-" else open(args.input, 'rU')
+    output = sys.stdout if args.output == "-" else open(args.output, 'w')
+    records = clusters = 0
+    try:
+        for row, cluster in enumerate(cluster_ids(input, args.delimiter,
+                args.max_records, args.temp_dir, args.fan_in)):
+            output.write('%d\n' % cluster)
+            records += 1
+            if cluster == row:
+                clusters += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if input is not sys.stdin:
+            input.close()
+    sys.stderr.write("%d addresses in %d clusters\n" % (records, clusters))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
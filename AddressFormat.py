@@ -7,695 +7,2210 @@ __version__ = 0.1
 __author__ = "Brandon Schlueter"
 
 import re
-FULL_ADDRESS = re.compile('^[0-9]+[ ]*'
-    '([NESW]?|NORTH|SOUTH|WEST|EAST|NORTHWEST|NORTHEAST|SOUTHEAST|SOUTHWEST)'
-    )
-
-STATE_TO_ABBREVIATION = {   "ALABAMA": "AL",
-                            "ALASKA": "AK",
-                            "AMERICAN SAMOA": "AS",
-                            "ARIZONA": "AZ",
-                            "ARKANSAS": "AR",
-                            "Armed Forces Africa": "AE",
-                            "Armed Forces Americas": "AA",
-                            "Armed Forces Canada": "AE",
-                            "Armed Forces Europe": "AE",
-                            "Armed Forces Middle East": "AE",
-                            "Armed Forces Pacific": "AP",
-                            "CALIFORNIA": "CA",
-                            "COLORADO": "CO",
-                            "CONNECTICUT": "CT",
-                            "DELAWARE": "DE",
-                            "DISTRICT OF COLUMBIA": "DC",
-                            "FEDERATED STATES OF MICRONESIA": "FM",
-                            "FLORIDA": "FL",
-                            "GEORGIA": "GA",
-                            "GUAM": "GU",
-                            "HAWAII": "HI",
-                            "IDAHO": "ID",
-                            "ILLINOIS": "IL",
-                            "INDIANA": "IN",
-                            "IOWA": "IA",
-                            "KANSAS": "KS",
-                            "KENTUCKY": "KY",
-                            "LOUISIANA": "LA",
-                            "MAINE": "ME",
-                            "MARSHALL ISLANDS": "MH",
-                            "MARYLAND": "MD",
-                            "MASSACHUSETTS": "MA",
-                            "MICHIGAN": "MI",
-                            "MINNESOTA": "MN",
-                            "MISSISSIPPI": "MS",
-                            "MISSOURI": "MO",
-                            "MONTANA": "MT",
-                            "NEBRASKA": "NE",
-                            "NEVADA": "NV",
-                            "NEW HAMPSHIRE": "NH",
-                            "NEW JERSEY": "NJ",
-                            "NEW MEXICO": "NM",
-                            "NEW YORK": "NY",
-                            "NORTH CAROLINA": "NC",
-                            "NORTH DAKOTA": "ND",
-                            "NORTHERN MARIANA ISLANDS": "MP",
-                            "OHIO": "OH",
-                            "OKLAHOMA": "OK",
-                            "OREGON": "OR",
-                            "PALAU": "PW",
-                            "PENNSYLVANIA": "PA",
-                            "PUERTO RICO": "PR",
-                            "RHODE ISLAND": "RI",
-                            "SOUTH CAROLINA": "SC",
-                            "SOUTH DAKOTA": "SD",
-                            "TENNESSEE": "TN",
-                            "TEXAS": "TX",
-                            "UTAH": "UT",
-                            "VERMONT": "VT",
-                            "VIRGIN ISLANDS": "VI",
-                            "VIRGINIA": "VA",
-                            "WASHINGTON": "WA",
-                            "WEST VIRGINIA": "WV",
-                            "WISCONSIN": "WI",
-                            "WYOMING": "WY",
-                            "Alberta": "AB",
-                            "British Columbia": "BC",
-                            "Manitoba": "MB",
-                            "New Brunswick": "NB",
-                            "Newfoundland": "NF",
-                            "Northwest Territories": "NT",
-                            "Nova Scotia": "NS",
-                            "Ontario": "ON",
-                            "Prince Edward Island": "PE",
-                            "Quebec": "QC",
-                            "Saskatchewan": "SK",
-                            "Yukon Territory": "YT"}
-
-GEOGRAPHIC_DIRECTIONALS =  {"North": "N", 
-                            "Northeast": "NE",
-                            "East": "E",
-                            "Southeast": "SE",
-                            "South": "S", 
-                            "Southwest": "SW",
-                            "West": "W", 
-                            "Northwest": "NW"}
-
-STREET_ABBREVIATIONS = {'AVEN': 'AVE',
-                        'AVNUE': 'AVE',
-                        'AVENU': 'AVE',
-                        'AVN': 'AVE',
-                        'AV': 'AVE',
-                        'AVE': 'AVE',
-                        'AVENUE': 'AVE',
-                        'BAYOU': 'BYU',
-                        'BAYOO': 'BYU',
-                        'BCH': 'BCH',
-                        'BEACH': 'BCH',
-                        'BEND': 'BND',
-                        'BND': 'BND',
-                        'BLUF': 'BLF',
-                        'BLF': 'BLF',
-                        'BLUFF': 'BLF',
-                        'BLUFFS': 'BLFS',
-                        'BTM': 'BTM',
-                        'BOTTM': 'BTM',
-                        'BOT': 'BTM',
-                        'BOTTOM': 'BTM',
-                        'BLVD': 'BLVD',
-                        'BOULV': 'BLVD',
-                        'BOUL': 'BLVD',
-                        'BOULEVARD': 'BLVD',
-                        'BRNCH': 'BR',
-                        'BR': 'BR',
-                        'BRANCH': 'BR',
-                        'BRG': 'BRG',
-                        'BRIDGE': 'BRG',
-                        'BRDGE': 'BRG',
-                        'BRK': 'BRK',
-                        'BROOK': 'BRK',
-                        'BROOKS': 'BRKS',
-                        'BURG': 'BG',
-                        'BURGS': 'BGS',
-                        'BYPS': 'BYP',
-                        'BYPA': 'BYP',
-                        'BYPAS': 'BYP',
-                        'BYP': 'BYP',
-                        'BYPASS': 'BYP',
-                        'CP': 'CP',
-                        'CAMP': 'CP',
-                        'CMP': 'CP',
-                        'CANYON': 'CYN',
-                        'CANYN': 'CYN',
-                        'CNYN': 'CYN',
-                        'CAPE': 'CPE',
-                        'CPE': 'CPE',
-                        'CSWY': 'CSWY',
-                        'CAUSWA': 'CSWY',
-                        'CAUSEWAY': 'CSWY',
-                        'CNTER': 'CTR',
-                        'CTR': 'CTR',
-                        'CENTRE': 'CTR',
-                        'CEN': 'CTR',
-                        'CENT': 'CTR',
-                        'CNTR': 'CTR',
-                        'CENTR': 'CTR',
-                        'CENTER': 'CTR',
-                        'CENTERS': 'CTRS',
-                        'CIRC': 'CIR',
-                        'CRCLE': 'CIR',
-                        'CIR': 'CIR',
-                        'CIRCL': 'CIR',
-                        'CIRCLE': 'CIR',
-                        'CRCL': 'CIR',
-                        'CIRCLES': 'CIRS',
-                        'CLF': 'CLF',
-                        'CLIFF': 'CLF',
-                        'CLIFFS': 'CLFS',
-                        'CLFS': 'CLFS',
-                        'CLUB': 'CLB',
-                        'CLB': 'CLB',
-                        'COMMON': 'CMN',
-                        'COMMONS': 'CMNS',
-                        'CORNER': 'COR',
-                        'COR': 'COR',
-                        'CORNERS': 'CORS',
-                        'CORS': 'CORS',
-                        'COURSE': 'CRSE',
-                        'CRSE': 'CRSE',
-                        'COURT': 'CT',
-                        'CT': 'CT',
-                        'COURTS': 'CTS',
-                        'CTS': 'CTS',
-                        'COVE': 'CV',
-                        'CV': 'CV',
-                        'COVES': 'CVS',
-                        'CRK': 'CRK',
-                        'CREEK': 'CRK',
-                        'CRSNT': 'CRES',
-                        'CRES': 'CRES',
-                        'CRESCENT': 'CRES',
-                        'CRSENT': 'CRES',
-                        'CREST': 'CRST',
-                        'CROSSING': 'XING',
-                        'CRSSNG': 'XING',
-                        'XING': 'XING',
-                        'CROSSROAD': 'XRD',
-                        'CROSSROADS': 'XRDS',
-                        'CURVE': 'CURV',
-                        'DALE': 'DL',
-                        'DL': 'DL',
-                        'DAM': 'DM',
-                        'DM': 'DM',
-                        'DV': 'DV',
-                        'DVD': 'DV',
-                        'DIV': 'DV',
-                        'DIVIDE': 'DV',
-                        'DRIV': 'DR',
-                        'DR': 'DR',
-                        'DRIVE': 'DR',
-                        'DRV': 'DR',
-                        'DRIVES': 'DRS',
-                        'EST': 'EST',
-                        'ESTATE': 'EST',
-                        'ESTATES': 'ESTS',
-                        'ESTS': 'ESTS',
-                        'EXPY': 'EXPY',
-                        'EXPR': 'EXPY',
-                        'EXPRESS': 'EXPY',
-                        'EXPW': 'EXPY',
-                        'EXP': 'EXPY',
-                        'EXPRESSWAY': 'EXPY',
-                        'EXTN': 'EXT',
-                        'EXT': 'EXT',
-                        'EXTNSN': 'EXT',
-                        'EXTENSION': 'EXT',
-                        'EXTS': 'EXTS',
-                        'EXTENSIONS': 'EXTS',
-                        'FALL': 'FALL',
-                        'FLS': 'FLS',
-                        'FALLS': 'FLS',
-                        'FERRY': 'FRY',
-                        'FRY': 'FRY',
-                        'FRRY': 'FRY',
-                        'FIELD': 'FLD',
-                        'FLD': 'FLD',
-                        'FIELDS': 'FLDS',
-                        'FLDS': 'FLDS',
-                        'FLAT': 'FLT',
-                        'FLT': 'FLT',
-                        'FLATS': 'FLTS',
-                        'FLTS': 'FLTS',
-                        'FRD': 'FRD',
-                        'FORD': 'FRD',
-                        'FORDS': 'FRDS',
-                        'FRST': 'FRST',
-                        'FOREST': 'FRST',
-                        'FORESTS': 'FRST',
-                        'FORGE': 'FRG',
-                        'FRG': 'FRG',
-                        'FORG': 'FRG',
-                        'FORGES': 'FRGS',
-                        'FORK': 'FRK',
-                        'FRK': 'FRK',
-                        'FORKS': 'FRKS',
-                        'FRKS': 'FRKS',
-                        'FRT': 'FT',
-                        'FT': 'FT',
-                        'FORT': 'FT',
-                        'FREEWAY': 'FWY',
-                        'FRWAY': 'FWY',
-                        'FRWY': 'FWY',
-                        'FREEWY': 'FWY',
-                        'FWY': 'FWY',
-                        'GARDN': 'GDN',
-                        'GRDN': 'GDN',
-                        'GARDEN': 'GDN',
-                        'GRDEN': 'GDN',
-                        'GDNS': 'GDNS',
-                        'GRDNS': 'GDNS',
-                        'GARDENS': 'GDNS',
-                        'GTWAY': 'GTWY',
-                        'GATWAY': 'GTWY',
-                        'GTWY': 'GTWY',
-                        'GATEWAY': 'GTWY',
-                        'GATEWY': 'GTWY',
-                        'GLEN': 'GLN',
-                        'GLN': 'GLN',
-                        'GLENS': 'GLNS',
-                        'GRN': 'GRN',
-                        'GREEN': 'GRN',
-                        'GREENS': 'GRNS',
-                        'GROVE': 'GRV',
-                        'GRV': 'GRV',
-                        'GROV': 'GRV',
-                        'GROVES': 'GRVS',
-                        'HARBOR': 'HBR',
-                        'HARBR': 'HBR',
-                        'HARB': 'HBR',
-                        'HRBOR': 'HBR',
-                        'HBR': 'HBR',
-                        'HARBORS': 'HBRS',
-                        'HAVEN': 'HVN',
-                        'HVN': 'HVN',
-                        'HTS': 'HTS',
-                        'HT': 'HTS',
-                        'HEIGHTS': 'HTS',
-                        'HIWY': 'HWY',
-                        'HIGHWAY': 'HWY',
-                        'HWY': 'HWY',
-                        'HWAY': 'HWY',
-                        'HIWAY': 'HWY',
-                        'HIGHWY': 'HWY',
-                        'HILL': 'HL',
-                        'HL': 'HL',
-                        'HLS': 'HLS',
-                        'HILLS': 'HLS',
-                        'HOLW': 'HOLW',
-                        'HOLWS': 'HOLW',
-                        'HLLW': 'HOLW',
-                        'HOLLOWS': 'HOLW',
-                        'HOLLOW': 'HOLW',
-                        'INLT': 'INLT',
-                        'INLET': 'INLT',
-                        'ISLAND': 'IS',
-                        'IS': 'IS',
-                        'ISLND': 'IS',
-                        'ISS': 'ISS',
-                        'ISLANDS': 'ISS',
-                        'ISLNDS': 'ISS',
-                        'ISLE': 'ISLE',
-                        'ISLES': 'ISLE',
-                        'JCT': 'JCT',
-                        'JCTN': 'JCT',
-                        'JUNCTION': 'JCT',
-                        'JCTION': 'JCT',
-                        'JUNCTN': 'JCT',
-                        'JUNCTON': 'JCT',
-                        'JCTNS': 'JCTS',
-                        'JCTS': 'JCTS',
-                        'JUNCTIONS': 'JCTS',
-                        'KY': 'KY',
-                        'KEY': 'KY',
-                        'KEYS': 'KYS',
-                        'KYS': 'KYS',
-                        'KNL': 'KNL',
-                        'KNOL': 'KNL',
-                        'KNOLL': 'KNL',
-                        'KNOLLS': 'KNLS',
-                        'KNLS': 'KNLS',
-                        'LAKE': 'LK',
-                        'LK': 'LK',
-                        'LAKES': 'LKS',
-                        'LKS': 'LKS',
-                        'LAND': 'LAND',
-                        'LNDNG': 'LNDG',
-                        'LNDG': 'LNDG',
-                        'LANDING': 'LNDG',
-                        'LN': 'LN',
-                        'LANE': 'LN',
-                        'LIGHT': 'LGT',
-                        'LGT': 'LGT',
-                        'LIGHTS': 'LGTS',
-                        'LF': 'LF',
-                        'LOAF': 'LF',
-                        'LOCK': 'LCK',
-                        'LCK': 'LCK',
-                        'LOCKS': 'LCKS',
-                        'LCKS': 'LCKS',
-                        'LODGE': 'LDG',
-                        'LDGE': 'LDG',
-                        'LODG': 'LDG',
-                        'LDG': 'LDG',
-                        'LOOPS': 'LOOP',
-                        'LOOP': 'LOOP',
-                        'MALL': 'MALL',
-                        'MNR': 'MNR',
-                        'MANOR': 'MNR',
-                        'MNRS': 'MNRS',
-                        'MANORS': 'MNRS',
-                        'MEADOW': 'MDW',
-                        'MDWS': 'MDWS',
-                        'MEADOWS': 'MDWS',
-                        'MEDOWS': 'MDWS',
-                        'MDW': 'MDWS',
-                        'MEWS': 'MEWS',
-                        'MILL': 'ML',
-                        'MILLS': 'MLS',
-                        'MISSN': 'MSN',
-                        'MISSION': 'MSN',
-                        'MSSN': 'MSN',
-                        'MOTORWAY': 'MTWY',
-                        'MT': 'MT',
-                        'MOUNT': 'MT',
-                        'MNT': 'MT',
-                        'MOUNTAIN': 'MTN',
-                        'MOUNTIN': 'MTN',
-                        'MNTN': 'MTN',
-                        'MNTAIN': 'MTN',
-                        'MTN': 'MTN',
-                        'MTIN': 'MTN',
-                        'MOUNTAINS': 'MTNS',
-                        'MNTNS': 'MTNS',
-                        'NCK': 'NCK',
-                        'NECK': 'NCK',
-                        'ORCHRD': 'ORCH',
-                        'ORCH': 'ORCH',
-                        'ORCHARD': 'ORCH',
-                        'OVAL': 'OVAL',
-                        'OVL': 'OVAL',
-                        'OVERPASS': 'OPAS',
-                        'PARK': 'PARK',
-                        'PRK': 'PARK',
-                        'PARKS': 'PARK',
-                        'PKY': 'PKWY',
-                        'PARKWAY': 'PKWY',
-                        'PKWY': 'PKWY',
-                        'PARKWY': 'PKWY',
-                        'PKWAY': 'PKWY',
-                        'PARKWAYS': 'PKWY',
-                        'PKWYS': 'PKWY',
-                        'PASS': 'PASS',
-                        'PASSAGE': 'PSGE',
-                        'PATH': 'PATH',
-                        'PATHS': 'PATH',
-                        'PIKE': 'PIKE',
-                        'PIKES': 'PIKE',
-                        'PINE': 'PNE',
-                        'PINES': 'PNES',
-                        'PNES': 'PNES',
-                        'PLACE': 'PL',
-                        'PL': 'PL',
-                        'PLAIN': 'PLN',
-                        'PLN': 'PLN',
-                        'PLAINS': 'PLNS',
-                        'PLNS': 'PLNS',
-                        'PLAZA': 'PLZ',
-                        'PLZ': 'PLZ',
-                        'PLZA': 'PLZ',
-                        'PT': 'PT',
-                        'POINT': 'PT',
-                        'POINTS': 'PTS',
-                        'PTS': 'PTS',
-                        'PRT': 'PRT',
-                        'PORT': 'PRT',
-                        'PRTS': 'PRTS',
-                        'PORTS': 'PRTS',
-                        'PR': 'PR',
-                        'PRAIRIE': 'PR',
-                        'PRR': 'PR',
-                        'RADL': 'RADL',
-                        'RAD': 'RADL',
-                        'RADIEL': 'RADL',
-                        'RADIAL': 'RADL',
-                        'RAMP': 'RAMP',
-                        'RANCHES': 'RNCH',
-                        'RANCH': 'RNCH',
-                        'RNCH': 'RNCH',
-                        'RNCHS': 'RNCH',
-                        'RAPID': 'RPD',
-                        'RPD': 'RPD',
-                        'RPDS': 'RPDS',
-                        'RAPIDS': 'RPDS',
-                        'RST': 'RST',
-                        'REST': 'RST',
-                        'RDG': 'RDG',
-                        'RIDGE': 'RDG',
-                        'RDGE': 'RDG',
-                        'RDGS': 'RDGS',
-                        'RIDGES': 'RDGS',
-                        'RIV': 'RIV',
-                        'RVR': 'RIV',
-                        'RIVER': 'RIV',
-                        'RIVR': 'RIV',
-                        'RD': 'RD',
-                        'ROAD': 'RD',
-                        'ROADS': 'RDS',
-                        'RDS': 'RDS',
-                        'ROUTE': 'RTE',
-                        'ROW': 'ROW',
-                        'RUE': 'RUE',
-                        'RUN': 'RUN',
-                        'SHL': 'SHL',
-                        'SHOAL': 'SHL',
-                        'SHLS': 'SHLS',
-                        'SHOALS': 'SHLS',
-                        'SHOAR': 'SHR',
-                        'SHORE': 'SHR',
-                        'SHR': 'SHR',
-                        'SHORES': 'SHRS',
-                        'SHOARS': 'SHRS',
-                        'SHRS': 'SHRS',
-                        'SKYWAY': 'SKWY',
-                        'SPRING': 'SPG',
-                        'SPNG': 'SPG',
-                        'SPRNG': 'SPG',
-                        'SPG': 'SPG',
-                        'SPRINGS': 'SPGS',
-                        'SPGS': 'SPGS',
-                        'SPRNGS': 'SPGS',
-                        'SPNGS': 'SPGS',
-                        'SPUR': 'SPUR',
-                        'SPURS': 'SPUR',
-                        'SQR': 'SQ',
-                        'SQ': 'SQ',
-                        'SQUARE': 'SQ',
-                        'SQU': 'SQ',
-                        'SQRE': 'SQ',
-                        'SQRS': 'SQS',
-                        'SQUARES': 'SQS',
-                        'STATN': 'STA',
-                        'STN': 'STA',
-                        'STATION': 'STA',
-                        'STA': 'STA',
-                        'STRAV': 'STRA',
-                        'STRAVEN': 'STRA',
-                        'STRAVN': 'STRA',
-                        'STRVN': 'STRA',
-                        'STRAVENUE': 'STRA',
-                        'STRVNUE': 'STRA',
-                        'STRA': 'STRA',
-                        'STREME': 'STRM',
-                        'STRM': 'STRM',
-                        'STREAM': 'STRM',
-                        'STREET': 'ST',
-                        'ST': 'ST',
-                        'STR': 'ST',
-                        'STRT': 'ST',
-                        'STREETS': 'STS',
-                        'SMT': 'SMT',
-                        'SUMMIT': 'SMT',
-                        'SUMITT': 'SMT',
-                        'SUMIT': 'SMT',
-                        'TER': 'TER',
-                        'TERRACE': 'TER',
-                        'TERR': 'TER',
-                        'THROUGHWAY': 'TRWY',
-                        'TRCE': 'TRCE',
-                        'TRACES': 'TRCE',
-                        'TRACE': 'TRCE',
-                        'TRACK': 'TRAK',
-                        'TRACKS': 'TRAK',
-                        'TRKS': 'TRAK',
-                        'TRK': 'TRAK',
-                        'TRAK': 'TRAK',
-                        'TRAFFICWAY': 'TRFY',
-                        'TRLS': 'TRL',
-                        'TRAIL': 'TRL',
-                        'TRL': 'TRL',
-                        'TRAILS': 'TRL',
-                        'TRLR': 'TRLR',
-                        'TRLRS': 'TRLR',
-                        'TRAILER': 'TRLR',
-                        'TUNEL': 'TUNL',
-                        'TUNNEL': 'TUNL',
-                        'TUNLS': 'TUNL',
-                        'TUNL': 'TUNL',
-                        'TUNNL': 'TUNL',
-                        'TUNNELS': 'TUNL',
-                        'TURNPIKE': 'TPKE',
-                        'TURNPK': 'TPKE',
-                        'TRNPK': 'TPKE',
-                        'UNDERPASS': 'UPAS',
-                        'UNION': 'UN',
-                        'UN': 'UN',
-                        'UNIONS': 'UNS',
-                        'VLY': 'VLY',
-                        'VALLEY': 'VLY',
-                        'VALLY': 'VLY',
-                        'VLLY': 'VLY',
-                        'VALLEYS': 'VLYS',
-                        'VLYS': 'VLYS',
-                        'VIADUCT': 'VIA',
-                        'VDCT': 'VIA',
-                        'VIA': 'VIA',
-                        'VIADCT': 'VIA',
-                        'VW': 'VW',
-                        'VIEW': 'VW',
-                        'VWS': 'VWS',
-                        'VIEWS': 'VWS',
-                        'VILLAG': 'VLG',
-                        'VILLG': 'VLG',
-                        'VILLIAGE': 'VLG',
-                        'VLG': 'VLG',
-                        'VILL': 'VLG',
-                        'VILLAGE': 'VLG',
-                        'VLGS': 'VLGS',
-                        'VILLAGES': 'VLGS',
-                        'VILLE': 'VL',
-                        'VL': 'VL',
-                        'VSTA': 'VIS',
-                        'VIS': 'VIS',
-                        'VISTA': 'VIS',
-                        'VST': 'VIS',
-                        'VIST': 'VIS',
-                        'WALK': 'WALK',
-                        'WALKS': 'WALK',
-                        'WALL': 'WALL',
-                        'WY': 'WAY',
-                        'WAY': 'WAY',
-                        'WAYS': 'WAYS',
-                        'WELL': 'WL',
-                        'WLS': 'WLS',
-                        'WELLS': 'WLS'}
-
-SECONDARY_UNIT_DESIGNATORS = {"Apartment": "APT",
-                              "Basement": "BSMT",
-                              "Building": "BLDG",
-                              "Department": "DEPT",
-                              "Floor": "FL",
-                              "Front": "FRNT",
-                              "Hanger": "HNGR",
-                              "Key": "KEY",
-                              "Lobby": "LBBY",
-                              "Lot": "LOT",
-                              "Lower": "LOWR",
-                              "Office": "OFC",
-                              "Penthouse": "PH",
-                              "Pier": "PIER",
-                              "Rear": "REAR",
-                              "Room": "RM",
-                              "Side": "SIDE",
-                              "Slip": "SLIP",
-                              "Space": "SPC",
-                              "Stop": "STOP",
-                              "Suite": "STE",
-                              "Trailer": "TRLR",
-                              "Unit": "UNIT",
-                              "Upper": "UPPR"}
-
-
-def standardize(address, delimiter = "", error_level = 0):
+import csv
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import sqlite3
+import stat
+import string
+import struct
+import sys
+import threading
+import unicodedata
+from collections import Counter, OrderedDict, deque, namedtuple
+from array import array
+from contextlib import contextmanager
+from itertools import islice, izip
+from timeit import default_timer
+ZIP_CODE = re.compile('^[0-9]{5}(-[0-9]{4})?$')
+# a Canadian postal code, its two halves written with or without a space
+POSTAL_CODE = re.compile('^[ABCEGHJ-NPRSTVXY][0-9][ABCEGHJ-NPRSTV-Z] ?'
+                         '[0-9][ABCEGHJ-NPRSTV-Z][0-9]$')
+
+# the characters which normalize() keeps besides those asked for, once 
+# upper case; other punctuation becomes a space, and these are dropped so 
+# that 'ST.' reads 'ST' and "O'HARE" reads 'OHARE'
+_NORMALIZE_KEPT = string.ascii_letters + string.digits + '#-/ '
+_NORMALIZE_DROPPED = '.\'"`'
+# unicode characters folded into the ASCII they look like, besides the 
+# fullwidth forms and accented latin letters
+_UNICODE_LOOKALIKES = dict(
+        [(code, None) for code in (0x2018, 0x2019, 0x201a, 0x201b, 0x2032,
+                                   0x00b4, 0x02bc, 0x201c, 0x201d, 0x201e,
+                                   0x2033, 0x200b, 0x200c, 0x200d, 0xfeff)] +
+        [(code, u'-') for code in (0x2010, 0x2011, 0x2012, 0x2013, 0x2014,
+                                   0x2015, 0x2212, 0xfe63)] +
+        [(code, u' ') for code in [0x00a0, 0x1680, 0x2028, 0x2029, 0x202f,
+                                   0x205f, 0x3000] + range(0x2000, 0x200b)] +
+        [(code, u'#') for code in (0x2116, 0xfe5f)] +
+        [(code, u'/') for code in (0x2044, 0x2215)] +
+        [(ord(char), folded) for char, folded in
+         zip(u'\xdf\xe6\xc6\xf8\xd8\u0142\u0141\u0111\u0110\u0153\u0152',
+             (u'SS', u'AE', u'AE', u'O', u'O', u'L', u'L', u'D', u'D',
+              u'OE', u'OE'))])
+_normalize_tables = {}
+
+def normalize(text, keep = ""):
+    '''Returns the form of a raw address, or a part of one, which is 
+    parsed and cached: upper case, with periods and quotes dropped, 
+    other punctuation but "#", "-" and "/" and the characters of keep 
+    made spaces, "#" set apart as a word, dashes standing alone 
+    dropped and single spaces between words. Unicode text has 
+    look-alike quotes, dashes, spaces and fullwidth and accented 
+    letters folded into ASCII, and is returned as a str if nothing 
+    else remains, as is a str of bytes which are not all ASCII once 
+    decoded. The characters are mapped in one pass of a precomputed 
+    translation table.'''
+    tables = _normalize_tables.get(keep)
+    if tables is None:
+        tables = _normalize_tables[keep] = _normalize_table(keep)
+    if isinstance(text, unicode):
+        text = text.translate(tables[1])
+        try:
+            text = text.encode('ascii')
+        except UnicodeError:
+            text = text.upper()
+    else:
+        translated = text.translate(*tables[0])
+        if '\x80' in translated:
+            # bytes which are not ASCII are read as UTF-8, or else 
+            # Latin-1, and take the unicode path
+            try:
+                text = text.decode('utf-8')
+            except UnicodeError:
+                text = text.decode('latin-1')
+            return normalize(text, keep)
+        text = translated
+    if '#' in text:
+        text = text.replace('#', ' # ')
+    if ' - ' in text:
+        text = text.replace(' - ', ' ')
+    while '  ' in text:
+        text = text.replace('  ', ' ')
+    return text.strip(' ')
+
+def _normalize_table(keep):
+    '''Returns the translation table and characters to delete for str, 
+    and the translation table for unicode, which keep the characters 
+    of keep.'''
+    deleted = ''.join([char for char in _NORMALIZE_DROPPED
+                       if char not in keep])
+    # bytes which are not ASCII all become one, which is looked for to 
+    # tell when the text must be decoded
+    table = ''.join(['\x80' if char >= '\x80' else
+                     char.upper() if char in keep or char in deleted or
+                                     char in _NORMALIZE_KEPT
+                     else ' ' for char in map(chr, xrange(256))])
+    unicode_table = dict((code, None if table[code] in deleted
+                                else unicode(table[code]))
+                         for code in xrange(128))
+    unicode_table.update(_UNICODE_LOOKALIKES)
+    # the fullwidth forms of ASCII, as for ASCII itself
+    for code in xrange(0xff01, 0xff5f):
+        unicode_table[code] = unicode_table[code - 0xfee0]
+    for code in xrange(0xc0, 0x250):
+        if code not in unicode_table:
+            base = unicodedata.normalize('NFKD', unichr(code))[0]
+            if base < u'\x80' and base.isalpha():
+                unicode_table[code] = base.upper()
+    return (table, deleted), unicode_table
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'data')
+# each version of the table pack is a directory holding a tables.json of 
+# the state, directional, suffix and unit tables, and the other data files
+TABLES_DIRECTORY = os.path.join(DATA_DIRECTORY, 'tables')
+# environment variable pinning the version of the table pack used by default
+TABLES_VERSION_VARIABLE = 'ADDRESSFORMAT_TABLES'
+# the countries whose addresses Tables may be made for; the provinces and 
+# postal codes of Canada are in the pack's provinces.json
+COUNTRIES = ('US', 'CA')
+
+def table_versions():
+    '''Returns the versions of the table pack available, oldest first.'''
+    return sorted(os.listdir(TABLES_DIRECTORY), key = _version_key)
+
+def _version_key(version):
+    return [int(part) if part.isdigit() else part
+            for part in re.split('[.-]', version)]
+
+def _build_index(table):
+    '''Returns a copy of a name to abbreviation table keyed on the 
+    upper case names, the frozenset of its abbreviations and a map 
+    from each abbreviation back to the sorted tuple of names which 
+    abbreviate to it.'''
+    names = dict((name.upper(), code) for name, code in table.iteritems())
+    codes = frozenset(names.itervalues())
+    code_names = {}
+    for name, code in names.iteritems():
+        code_names.setdefault(code, []).append(name)
+    for code in code_names:
+        code_names[code] = tuple(sorted(code_names[code]))
+    return names, codes, code_names
+
+def _lookup(names, codes):
+    '''Returns a single map from both the names and the codes of an 
+    index to the code.'''
+    lookup = dict((code, code) for code in codes)
+    lookup.update(names)
+    return lookup
+
+def _trie_pattern(words):
+    '''Returns a regular expression alternation matching any of the 
+    words, factored into a prefix trie so that trying it costs one 
+    comparison per character rather than one per word.'''
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = None
+    return _trie_node_pattern(trie)
+
+def _trie_node_pattern(node):
+    branches = [re.escape(char) + _trie_node_pattern(node[char])
+                for char in sorted(node) if char]
+    if not branches:
+        return ''
+    if len(branches) == 1 and '' not in node:
+        return branches[0]
+    pattern = '(?:' + '|'.join(branches) + ')'
+    if '' in node:
+        pattern += '?'
+    return pattern
+
+def _full_address_pattern(directionals, suffixes, designators):
+    '''Builds the delivery address tokenizer from the directional, 
+    suffix and unit lookups.'''
+    parts = {'directional': _trie_pattern(directionals),
+             'suffix': _trie_pattern(suffixes),
+             'designator': _trie_pattern(designators),
+             'unit': '[0-9A-Z-]+'}
+    # what may follow the suffix, used to keep a directional which is 
+    # the whole street name, as in '101 NORTH ST', out of the predirectional
+    parts['tail'] = ('(?: (?:%(directional)s))?'
+                     '(?: (?:%(designator)s)(?:(?: \\#)? %(unit)s)?'
+                     '| \\# ?%(unit)s)?$'
+                     % parts)
+    return ('^(?P<number>[0-9][0-9A-Z/-]*(?: [0-9]+/[0-9]+)?)'
+            '(?: (?P<predirectional>%(directional)s)'
+                '(?! (?:%(suffix)s)%(tail)s))?'
+            ' (?P<street>.+?)'
+            '(?: (?P<suffix>%(suffix)s))?'
+            '(?: (?P<postdirectional>%(directional)s))?'
+            '(?: (?P<designator>%(designator)s)'
+                '(?:(?: \\#)? (?P<unit>%(unit)s))?'
+            '| \\# ?(?P<pound_unit>%(unit)s))?$' % parts)
+
+def _build_state_trie(states):
+    '''Builds a trie of the words of every state name and code in the 
+    states lookup, read from the last word to the first. A node which 
+    ends a state maps None to its code.'''
+    trie = {}
+    for name, code in states.iteritems():
+        node = trie
+        for word in reversed(name.split()):
+            node = node.setdefault(word, {})
+        node[None] = code
+    return trie
+
+def _state_length(words, state_trie, keep = 1):
+    '''Returns the number of words in the longest state name or code 
+    which ends the list of upper case words without taking the first 
+    keep words, or 0 if none does.'''
+    node, length = state_trie, 0
+    for i in xrange(len(words) - 1, keep - 1, -1):
+        node = node.get(words[i])
+        if node is None:
+            break
+        if None in node:
+            length = len(words) - i
+    return length
+
+def load_zip3_states(path = None):
+    '''Reads a file of 3 digit ZIP code prefixes, or inclusive ranges 
+    of them, each followed by the state codes it serves, and returns 
+    a list of 1000 entries indexed by prefix. Each entry is the 
+    frozenset of the codes served, or None if the prefix is not 
+    assigned. The file of the tables in use is read by default.'''
+    if path is None:
+        path = os.path.join(get_tables().directory, 'zip3_states.txt')
+    zip3_states = [None] * 1000
+    with open(path) as lines:
+        for line in lines:
+            line = line.split('#', 1)[0].split()
+            if not line:
+                continue
+            first, _, last = line[0].partition('-')
+            states = frozenset(line[1:])
+            for zip3 in xrange(int(first), int(last or first) + 1):
+                zip3_states[zip3] = states
+    return zip3_states
+
+def _deletes(word, distance):
+    '''Returns the set of strings made by deleting up to distance 
+    letters from word, including word itself.'''
+    deletes = set([word])
+    frontier = deletes
+    for _ in xrange(distance):
+        frontier = set([variant[:i] + variant[i + 1:]
+                        for variant in frontier
+                        for i in xrange(len(variant))])
+        deletes.update(frontier)
+    return deletes
+
+def _edit_distance(a, b, limit):
+    '''Returns the number of insertions, deletions, substitutions and 
+    transpositions of adjacent letters which turn a into b, or 
+    limit + 1 as soon as it is known to be more than limit.'''
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before, previous = None, range(len(b) + 1)
+    for i in xrange(1, len(a) + 1):
+        current = [i]
+        for j in xrange(1, len(b) + 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1,
+                           previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if (i > 1 and j > 1 and a[i - 1] == b[j - 2] and
+                    a[i - 2] == b[j - 1]):
+                distance = min(distance, before[j - 2] + 1)
+            current.append(distance)
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+class FuzzyIndex(object):
+    '''A SymSpell style index of the names of a name to code table 
+    under every deletion of up to max_distance letters, which finds 
+    the names close to a misspelling by looking up the misspelling's 
+    own deletions rather than comparing it with every name. The 
+    last max_corrections results are remembered, so that a 
+    misspelling which recurs is corrected with one lookup. Names 
+    shorter than min_length, which are mostly abbreviations, are 
+    never offered as corrections, since a real word is as likely to 
+    be a single edit away from one as a misspelling is.'''
+
+    def __init__(self, table, max_distance = 2, max_corrections = 10000,
+                 min_length = 5):
+        self.table = table
+        self.max_distance = max_distance
+        self.max_corrections = max_corrections
+        self.min_length = min_length
+        self._corrections = {}
+        index = {}
+        for name in table:
+            if len(name) < min_length:
+                continue
+            for delete in _deletes(name, max_distance):
+                index.setdefault(delete, []).append(name)
+        self._index = index
+
+    def allowed_distance(self, word):
+        '''Returns how many edits may be corrected in word: none for 
+        fewer than min_length letters, one for fewer than 8 and 
+        otherwise max_distance.'''
+        if len(word) < self.min_length:
+            return 0
+        if len(word) < 8:
+            return min(1, self.max_distance)
+        return self.max_distance
+
+    def correct(self, word):
+        '''Returns the code of the name closest to the word within its 
+        allowed distance, or None if there is no such name or the 
+        closest names have different codes.'''
+        try:
+            return self._corrections[word]
+        except KeyError:
+            pass
+        code = self._correct(word)
+        if len(self._corrections) >= self.max_corrections:
+            self._corrections.clear()
+        self._corrections[word] = code
+        return code
+
+    def _correct(self, word):
+        limit = self.allowed_distance(word)
+        if not limit:
+            return None
+        index, table = self._index, self.table
+        best, codes, seen = limit + 1, set(), set()
+        for delete in _deletes(word, limit):
+            for name in index.get(delete, ()):
+                if name in seen:
+                    continue
+                seen.add(name)
+                distance = _edit_distance(word, name, limit)
+                if distance > limit:
+                    continue
+                if distance < best:
+                    best, codes = distance, set([table[name]])
+                elif distance == best:
+                    codes.add(table[name])
+        if len(codes) == 1:
+            return codes.pop()
+        return None
+
+# the packed city alias index: a header of its magic, number of records 
+# and size of its strings, the first record of each zip5 from 00000 to 
+# 100000, the last being the number of records, each record's alias and 
+# preferred name as offsets into the strings sorted by zip5 and alias, 
+# and the strings, each prefixed by its length in one byte
+_CITY_MAGIC = 'CTY1'
+_CITY_HEADER = struct.Struct('>4sII')
+_CITY_ZIPS = 100001
+_CITY_ZIP_RANGE = struct.Struct('>II')
+_CITY_RECORD = struct.Struct('>II')
+
+def city_key(city):
+    '''Returns the form of a city name aliases are matched in: upper 
+    case, without periods or commas and with single spaces between 
+    words.'''
+    return normalize(city)
+
+def read_city_aliases(lines):
+    '''Reads lines of a zip5 or inclusive range of them, a city alias 
+    and its preferred name separated by tabs, ignoring # comments, 
+    and returns the sorted list of (zip5, alias key, preferred name) 
+    for every zip5, leaving out aliases which are already preferred.'''
+    aliases = {}
+    for line in lines:
+        line = line.split('#', 1)[0].rstrip('\r\n')
+        if not line.strip():
+            continue
+        zips, alias, preferred = line.split('\t')
+        first, _, last = zips.strip().partition('-')
+        alias, preferred = city_key(alias), city_key(preferred)
+        if alias == preferred:
+            continue
+        for zip in xrange(int(first), int(last or first) + 1):
+            aliases[zip, alias] = preferred
+    return sorted((zip, alias, preferred)
+                  for (zip, alias), preferred in aliases.iteritems())
+
+def pack_city_aliases(aliases):
+    '''Packs a sorted list of (zip5, alias key, preferred name) into 
+    the bytes searched by CityAliases.'''
+    strings, offsets, size = [], {}, 0
+    starts = array('I', [0]) * _CITY_ZIPS
+    records = []
+    for zip, alias, preferred in aliases:
+        for string in (alias, preferred):
+            if string not in offsets:
+                offsets[string] = size
+                strings.append(chr(len(string)) + string)
+                size += len(string) + 1
+        starts[zip + 1] += 1
+        records.append(_CITY_RECORD.pack(offsets[alias], offsets[preferred]))
+    for zip in xrange(1, _CITY_ZIPS):
+        starts[zip] += starts[zip - 1]
+    return ''.join([_CITY_HEADER.pack(_CITY_MAGIC, len(records), size),
+                    struct.pack('>%dI' % _CITY_ZIPS, *starts)] +
+                   records + strings)
+
+def write_city_aliases(input, output):
+    '''Reads the lines of city aliases in the open input file and 
+    writes them packed to the open binary output file, to be saved 
+    as city_aliases.bin in a table pack and mapped rather than read.'''
+    output.write(pack_city_aliases(read_city_aliases(input)))
+
+class CityAliases(object):
+    '''Finds the preferred name of a city in a zip code in the packed 
+    alias index held by blob, bytes or a memory map of them, without 
+    building any Python object per alias. The records of a zip code 
+    are found by its position in the index and searched by binary 
+    search on the alias.'''
+
+    def __init__(self, blob):
+        magic, self.count, size = _CITY_HEADER.unpack_from(blob, 0)
+        if magic != _CITY_MAGIC:
+            raise ValueError("Not a city alias index")
+        self._blob = blob
+        self._records = _CITY_HEADER.size + 4 * _CITY_ZIPS
+        self._strings = self._records + _CITY_RECORD.size * self.count
+
+    def __len__(self):
+        return self.count
+
+    def preferred(self, zip5, city):
+        '''Returns the preferred name of the city in the zip5, which 
+        must be 5 digits, or city itself if it has no alias there.'''
+        blob = self._blob
+        low, high = _CITY_ZIP_RANGE.unpack_from(
+                blob, _CITY_HEADER.size + 4 * int(zip5))
+        if low == high:
+            return city
+        key = city_key(city)
+        record, string = _CITY_RECORD.unpack_from, self._string
+        while low < high:
+            middle = (low + high) // 2
+            alias, preferred = record(blob, self._records +
+                                      _CITY_RECORD.size * middle)
+            alias = string(alias)
+            if alias < key:
+                low = middle + 1
+            elif alias > key:
+                high = middle
+            else:
+                return string(preferred)
+        return city
+
+    def _string(self, offset):
+        start = self._strings + offset
+        return self._blob[start + 1:start + 1 + ord(self._blob[start])]
+
+class Tables(object):
+    '''The lookup tables of one version of the table pack, with the 
+    indexes, patterns and tries built from them. Nothing is read or 
+    built until it is first used, and the indexes are shared by 
+    every call and must not be modified. The states are those the 
+    pack lists, which include the Canadian provinces, unless 
+    countries are given: ("US",) for the states alone, or ("US", 
+    "CA") for the provinces as well, with Canadian postal codes 
+    accepted as zip codes.'''
+
+    def __init__(self, version = None, countries = None):
+        if version is None:
+            version = (os.environ.get(TABLES_VERSION_VARIABLE) or
+                       table_versions()[-1])
+        if countries is not None:
+            countries = tuple(countries)
+            for country in countries:
+                if country not in COUNTRIES:
+                    raise ValueError("Unknown country: "+country)
+            if 'US' not in countries:
+                raise ValueError("The tables always hold the US")
+        self.version = version
+        self.countries = countries
+        self.directory = os.path.join(TABLES_DIRECTORY, version)
+        if not os.path.isfile(os.path.join(self.directory, 'tables.json')):
+            raise ValueError("Unknown table version: "+version)
+        self._fuzzy_indexes = {}
+        self._mapped = {}
+
+    def __repr__(self):
+        if self.countries is None:
+            return 'Tables(%r)' % self.version
+        return 'Tables(%r, %r)' % (self.version, self.countries)
+
+    def __getattr__(self, name):
+        # only called for attributes which have not been built yet
+        try:
+            build = _TABLE_BUILDERS[name]
+        except KeyError:
+            raise AttributeError(name)
+        build(self)
+        return self.__dict__[name]
+
+    def _load_pack(self):
+        with open(os.path.join(self.directory, 'tables.json')) as pack:
+            pack = json.load(pack)
+        self.postal_districts = None
+        if self.countries is not None:
+            self._load_provinces(pack['state_to_abbreviation'])
+        for name in _PACK_TABLES:
+            # interned so that every result shares the same abbreviations
+            setattr(self, name, dict((intern(str(key)), intern(str(value)))
+                                     for key, value in pack[name].iteritems()))
+
+    def _load_provinces(self, states):
+        # the provinces the pack lists among the states are replaced by 
+        # those of provinces.json, or dropped for the US alone
+        with open(os.path.join(self.directory, 'provinces.json')) as pack:
+            pack = json.load(pack)
+        provinces = pack['provinces']
+        codes = frozenset(provinces.itervalues())
+        for name, code in states.items():
+            if name.upper() in provinces or code in codes:
+                del states[name]
+        if 'CA' in self.countries:
+            states.update(provinces)
+            self.postal_districts = dict(
+                    (str(letter), frozenset(map(str, codes)))
+                    for letter, codes in pack['postal_districts'].iteritems())
+
+    def _build_indexes(self):
+        (self.state_name_index, self.state_codes,
+         self.state_code_index) = _build_index(self.state_to_abbreviation)
+        (self.suffix_name_index, self.suffix_codes,
+         self.suffix_code_index) = _build_index(self.street_abbreviations)
+        (self.directional_name_index, self.directional_codes,
+         self.directional_code_index) = \
+                _build_index(self.geographic_directionals)
+        (self.unit_name_index, self.unit_codes,
+         self.unit_code_index) = _build_index(self.secondary_unit_designators)
+        self.state_lookup = _lookup(self.state_name_index, self.state_codes)
+        self.directional_lookup = _lookup(self.directional_name_index,
+                                          self.directional_codes)
+        self.suffix_lookup = _lookup(self.suffix_name_index,
+                                     self.suffix_codes)
+        self.unit_lookup = _lookup(self.unit_name_index, self.unit_codes)
+
+    def _build_full_address(self):
+        # labels every token of a space delimited, upper case delivery 
+        # address in one left to right match
+        self.full_address = re.compile(_full_address_pattern(
+                self.directional_lookup, self.suffix_lookup,
+                self.unit_lookup))
+
+    def _build_state_trie(self):
+        self.state_trie = _build_state_trie(self.state_lookup)
+
+    def _load_zip3_states(self):
+        self.zip3_states = load_zip3_states(
+                os.path.join(self.directory, 'zip3_states.txt'))
+
+    def _load_city_aliases(self):
+        # a packed index is mapped, and one is packed in memory from the 
+        # lines of aliases if the pack has only those
+        path = os.path.join(self.directory, 'city_aliases')
+        if os.path.isfile(path + '.bin'):
+            self.city_aliases = CityAliases(self.mapped('city_aliases.bin'))
+        elif os.path.isfile(path + '.txt'):
+            with open(path + '.txt') as lines:
+                self.city_aliases = CityAliases(pack_city_aliases(
+                        read_city_aliases(lines)))
+        else:
+            self.city_aliases = None
+
+    def build(self):
+        '''Loads and builds everything but the fuzzy indexes now, as 
+        before forking workers which should share it.'''
+        for name in _TABLE_BUILDERS:
+            getattr(self, name)
+        return self
+
+    def fuzzy_index(self, name):
+        '''Returns the FuzzyIndex of the "suffix", "state" or "unit" 
+        table, building it the first time it is needed.'''
+        index = self._fuzzy_indexes.get(name)
+        if index is None:
+            index = self._fuzzy_indexes[name] = FuzzyIndex(
+                    getattr(self, _FUZZY_TABLES[name]))
+        return index
+
+    def mapped(self, name):
+        '''Returns a read only memory map of the pack's file called 
+        name, so that large tables are paged in only as they are used 
+        and their pages are shared by every process mapping them.'''
+        mapped = self._mapped.get(name)
+        if mapped is None:
+            with open(os.path.join(self.directory, name), 'rb') as data:
+                mapped = mmap.mmap(data.fileno(), 0,
+                                   access = mmap.ACCESS_READ)
+            self._mapped[name] = mapped
+        return mapped
+
+_PACK_TABLES = ('state_to_abbreviation', 'geographic_directionals',
+                'street_abbreviations', 'secondary_unit_designators')
+_TABLE_BUILDERS = dict([(name, Tables._load_pack)
+                        for name in _PACK_TABLES + ('postal_districts',)])
+for _kind in ('state', 'suffix', 'directional', 'unit'):
+    for _index in ('_name_index', '_codes', '_code_index', '_lookup'):
+        _TABLE_BUILDERS[_kind + _index] = Tables._build_indexes
+_TABLE_BUILDERS.update({'full_address': Tables._build_full_address,
+                        'state_trie': Tables._build_state_trie,
+                        'zip3_states': Tables._load_zip3_states,
+                        'city_aliases': Tables._load_city_aliases})
+_FUZZY_TABLES = {'suffix': 'suffix_lookup',
+                 'state': 'state_name_index',
+                 'unit': 'unit_lookup'}
+
+_tables = None
+
+def get_tables():
+    '''Returns the Tables in use, those of the version pinned by the 
+    ADDRESSFORMAT_TABLES environment variable or else the newest, 
+    until use_tables() is called.'''
+    global _tables
+    if _tables is None:
+        _tables = Tables()
+    return _tables
+
+def use_tables(version = None):
+    '''Pins the version of the table pack used from now on, or the 
+    default version if None, clearing the cache of results computed 
+    from the tables used before. Returns the new Tables.'''
+    global _tables, _standardizer
+    _tables = Tables(version)
+    _standardizer = None
+    if _cache is not None:
+        _cache.clear()
+    return _tables
+
+def fuzzy_index(name):
+    '''Returns the FuzzyIndex of the "suffix", "state" or "unit" table 
+    in use.'''
+    return get_tables().fuzzy_index(name)
+
+class _TableView(object):
+    '''Stands at module level for a table, index or pattern of the 
+    Tables in use, which is only loaded when it is first used.'''
+    __slots__ = ('_name',)
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attribute):
+        return getattr(getattr(get_tables(), self._name), attribute)
+
+    def __getitem__(self, key):
+        return getattr(get_tables(), self._name)[key]
+
+    def __contains__(self, key):
+        return key in getattr(get_tables(), self._name)
+
+    def __iter__(self):
+        return iter(getattr(get_tables(), self._name))
+
+    def __len__(self):
+        return len(getattr(get_tables(), self._name))
+
+    def __repr__(self):
+        return repr(getattr(get_tables(), self._name))
+
+STATE_TO_ABBREVIATION = _TableView('state_to_abbreviation')
+GEOGRAPHIC_DIRECTIONALS = _TableView('geographic_directionals')
+STREET_ABBREVIATIONS = _TableView('street_abbreviations')
+SECONDARY_UNIT_DESIGNATORS = _TableView('secondary_unit_designators')
+STATE_NAME_INDEX = _TableView('state_name_index')
+STATE_CODES = _TableView('state_codes')
+STATE_CODE_INDEX = _TableView('state_code_index')
+SUFFIX_NAME_INDEX = _TableView('suffix_name_index')
+SUFFIX_CODES = _TableView('suffix_codes')
+SUFFIX_CODE_INDEX = _TableView('suffix_code_index')
+DIRECTIONAL_NAME_INDEX = _TableView('directional_name_index')
+DIRECTIONAL_CODES = _TableView('directional_codes')
+DIRECTIONAL_CODE_INDEX = _TableView('directional_code_index')
+UNIT_NAME_INDEX = _TableView('unit_name_index')
+UNIT_CODES = _TableView('unit_codes')
+UNIT_CODE_INDEX = _TableView('unit_code_index')
+DIRECTIONAL_LOOKUP = _TableView('directional_lookup')
+SUFFIX_LOOKUP = _TableView('suffix_lookup')
+UNIT_LOOKUP = _TableView('unit_lookup')
+FULL_ADDRESS = _TableView('full_address')
+STATE_TRIE = _TableView('state_trie')
+ZIP3_STATES = _TableView('zip3_states')
+
+
+class LRUCache(object):
+    '''A map from keys to results holding at most max_size entries, 
+    which evicts the least recently used entry to make room and 
+    counts its hits, misses and evictions. It may be shared by any 
+    number of threads, each change being made under a lock.'''
+
+    def __init__(self, max_size = 100000):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default = None):
+        '''Returns the result stored for key, marking it as the most 
+        recently used, or default if there is none.'''
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        '''Stores the result for key, evicting the least recently used 
+        entry if the cache is full.'''
+        entries = self._entries
+        with self._lock:
+            entries.pop(key, None)
+            entries[key] = value
+            if len(entries) > self.max_size:
+                entries.popitem(last = False)
+                self.evictions += 1
+
+    def clear(self):
+        '''Removes every entry and resets the counters.'''
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        '''Returns the counters, size and hit rate as a dict.'''
+        lookups = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0}
+
+_cache = None
+_MISSING = object()
+
+def set_cache(cache):
+    '''Memoizes delivery_address_standardize() and 
+    last_line_standardize(), and so standardize(), in the given 
+    LRUCache, keyed on the input, the options which affect the 
+    result and the tables it is found with. Passing None turns 
+    memoization off. Errors are never cached, and the issues found 
+    in a cached result are reported again each time it is used. The 
+    cache is shared by every thread. Returns the cache which was in 
+    use before.'''
+    global _cache, _standardizer
+    previous, _cache = _cache, cache
+    _standardizer = None
+    return previous
+
+def get_cache():
+    '''Returns the LRUCache in use, or None.'''
+    return _cache
+
+class InternPool(object):
+    '''Maps each string to one canonical copy of it, so that the 
+    results of many addresses share their cities, zip codes, street 
+    names and numbers instead of each holding copies. At most 
+    max_size strings are held; once the pool is full, strings it 
+    does not hold are returned as they are, and those it does hold 
+    stay shared.'''
+
+    def __init__(self, max_size = 100000):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.max_size = max_size
+        self._strings = {}
+
+    def __len__(self):
+        return len(self._strings)
+
+    def intern(self, value):
+        '''Returns the canonical copy of value.'''
+        strings = self._strings
+        canonical = strings.get(value)
+        if canonical is None:
+            if len(strings) >= self.max_size:
+                return value
+            strings[value] = canonical = value
+        return canonical
+
+    def clear(self):
+        '''Removes every string.'''
+        self._strings.clear()
+
+_interning = None
+
+def set_interning(pool):
+    '''Replaces the primary number, street name, unit, city and zip5 
+    of every address parsed from now on with its copy in the given 
+    InternPool, or stops if None, which is the default. Results are 
+    best held as the ParsedAddress of breakdown(), which refers to 
+    the shared parts rather than joining them into a new string. 
+    The states, suffixes, directionals and unit designators of 
+    results are always shared with the tables. Returns the pool 
+    which was in use before.'''
+    global _interning
+    previous, _interning = _interning, pool
+    return previous
+
+def get_interning():
+    '''Returns the InternPool in use, or None.'''
+    return _interning
+
+# issue codes reported for addresses which are standardized with warnings
+BAD_ZIP = 'bad_zip'
+UNKNOWN_STATE = 'unknown_state'
+ZIP_STATE_MISMATCH = 'zip_state_mismatch'
+# issue codes reported when a misspelled part has been corrected
+CORRECTED_SUFFIX = 'corrected_suffix'
+CORRECTED_STATE = 'corrected_state'
+CORRECTED_UNIT = 'corrected_unit'
+# issue code of a record which could not be standardized at all, used 
+# where one bad record must not stop the rest
+UNPARSEABLE = 'unparseable'
+# issue code of a street with no recognized suffix, which only validate() 
+# reports since many streets have none
+UNKNOWN_SUFFIX = 'unknown_suffix'
+
+# the bit of each issue code in an issue mask
+ISSUE_BITS = {BAD_ZIP: 1,
+              UNKNOWN_STATE: 2,
+              ZIP_STATE_MISMATCH: 4,
+              CORRECTED_SUFFIX: 8,
+              CORRECTED_STATE: 16,
+              CORRECTED_UNIT: 32,
+              UNPARSEABLE: 64,
+              UNKNOWN_SUFFIX: 128}
+
+def issue_mask(issues):
+    '''Returns the issue mask of a sequence of issue codes.'''
+    mask = 0
+    for code in issues:
+        mask |= ISSUE_BITS[code]
+    return mask
+
+def mask_issues(mask):
+    '''Returns the tuple of issue codes in an issue mask.'''
+    return tuple(sorted([code for code, bit in ISSUE_BITS.iteritems()
+                         if mask & bit], key = ISSUE_BITS.get))
+
+class Diagnostics(object):
+    '''Collects the issues found while standardizing, counting each 
+    issue code and passing every issue to callback(code, address), 
+    with the raw address it was found in, if a callback is given.'''
+
+    def __init__(self, callback = None):
+        self.counts = Counter()
+        self.callback = callback
+
+    def report(self, issues, address):
+        '''Records the issue codes found in one address.'''
+        counts, callback = self.counts, self.callback
+        for code in issues:
+            counts[code] += 1
+            if callback is not None:
+                callback(code, address)
+
+    def clear(self):
+        '''Resets the counts.'''
+        self.counts.clear()
+
+    def stats(self):
+        '''Returns the count of each issue code as a dict.'''
+        return dict(self.counts)
+
+_diagnostics = None
+
+def set_diagnostics(diagnostics):
+    '''Sends the issues found in addresses standardized with an 
+    error_level other than 1 to diagnostics, a Diagnostics or any 
+    object with the same report() method. Passing None discards 
+    them, which is the default, so that nothing is written 
+    anywhere but by the sink. Returns the sink which was in use 
+    before.'''
+    global _diagnostics
+    previous, _diagnostics = _diagnostics, diagnostics
+    return previous
+
+def get_diagnostics():
+    '''Returns the diagnostics sink in use, or None.'''
+    return _diagnostics
+
+class Profile(object):
+    '''Counts the calls of each stage of standardizing and the seconds 
+    spent in them. The stages are the public functions themselves, 
+    "split" into delivery address and last line, "delivery_address" 
+    and "last_line" parsing, which include "tokenize" and "correct" 
+    and "last_line_split", "zip", "state", "zip3" and "city" aliases 
+    respectively, and "format" and "report" to the diagnostics 
+    sink.'''
+
+    def __init__(self):
+        self.calls = Counter()
+        self.seconds = Counter()
+
+    def lap(self, stage, start):
+        '''Adds one call of stage taking the time since start, and 
+        returns the time now to start the next stage from.'''
+        now = default_timer()
+        self.calls[stage] += 1
+        self.seconds[stage] += now - start
+        return now
+
+    def merge(self, snapshot):
+        '''Adds the counts of a snapshot, as taken in a worker process.'''
+        for stage, counts in snapshot.iteritems():
+            self.calls[stage] += counts['calls']
+            self.seconds[stage] += counts['seconds']
+
+    def clear(self):
+        '''Resets the counts.'''
+        self.calls.clear()
+        self.seconds.clear()
+
+    def snapshot(self):
+        '''Returns the calls, cumulative seconds and mean microseconds 
+        of each stage as a dict.'''
+        calls, seconds = self.calls, self.seconds
+        return dict((stage, {'calls': calls[stage],
+                             'seconds': seconds[stage],
+                             'mean_us': seconds[stage] * 1e6 / calls[stage]})
+                    for stage in calls)
+
+_profile = None
+
+def set_profile(profile):
+    '''Times the stages of standardizing in the given Profile, or 
+    not at all if None, which is the default and costs one check per 
+    stage. Returns the Profile which was in use before.'''
+    global _profile
+    previous, _profile = _profile, profile
+    return previous
+
+def get_profile():
+    '''Returns the Profile in use, or None.'''
+    return _profile
+
+@contextmanager
+def profiling(profile = None):
+    '''Times the stages of the standardizing done within a with 
+    statement in the given Profile, or a new one, which is returned 
+    by the with statement.'''
+    if profile is None:
+        profile = Profile()
+    previous = set_profile(profile)
+    try:
+        yield profile
+    finally:
+        set_profile(previous)
+
+def _report(issues, address):
+    profile = _profile
+    if profile is None:
+        _diagnostics.report(issues, address)
+    else:
+        start = default_timer()
+        _diagnostics.report(issues, address)
+        profile.lap('report', start)
+
+class Standardizer(object):
+    '''Standardizes addresses with one set of Tables and the options 
+    it is made with, all of which are built when it is made and 
+    never changed afterwards, so that one Standardizer may be shared 
+    by every thread of a pool without locks, and several with 
+    different tables, such as one for the US alone and one for the 
+    US and Canada, may be used side by side. Its methods take the 
+    options of the module functions of the same names, using the 
+    delimiter, divider and error_level of the Standardizer for 
+    those not given, the divider being that of last lines alone. 
+    Each thread keeps its own LRUCache of cache_size results, 
+    unless an LRUCache is given as cache to be shared by every 
+    thread, as set_cache() shares one; its keys hold the version and 
+    countries of the tables, so Standardizers with different tables 
+    may share it too. The diagnostics sink, 
+    profile and intern pool are those set for the module.'''
+    __slots__ = ('tables', 'delimiter', 'divider', 'error_level',
+                 'cache_size', '_cache', '_local')
+
+    def __init__(self, tables = None, delimiter = "", divider = "",
+                 error_level = 0, cache_size = 0, cache = None):
+        if tables is None:
+            tables = get_tables()
+        elif not isinstance(tables, Tables):
+            tables = Tables(tables)
+        # everything is built now so that threads only ever read it; the 
+        # corrections a FuzzyIndex remembers are single dict updates, 
+        # which the GIL keeps whole
+        tables.build()
+        for name in _FUZZY_TABLES:
+            tables.fuzzy_index(name)
+        initialize = object.__setattr__
+        initialize(self, 'tables', tables)
+        initialize(self, 'delimiter', delimiter)
+        initialize(self, 'divider', divider)
+        initialize(self, 'error_level', error_level)
+        initialize(self, 'cache_size', cache_size)
+        initialize(self, '_cache', cache)
+        initialize(self, '_local', threading.local()
+                   if cache is None and cache_size > 0 else None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Standardizer is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Standardizer is immutable")
+
+    def __repr__(self):
+        return 'Standardizer(%r, %r, %r, %r, %r)' % (
+                self.tables, self.delimiter, self.divider, self.error_level,
+                self.cache_size)
+
+    def get_cache(self):
+        '''Returns the LRUCache used by the calling thread, or None.'''
+        local = self._local
+        if local is None:
+            return self._cache
+        try:
+            return local.cache
+        except AttributeError:
+            cache = local.cache = LRUCache(self.cache_size)
+            return cache
+
+    def standardize(self, address, delimiter = None, error_level = None,
+                    with_issues = False, with_format = False):
+        '''As standardize().'''
+        if delimiter is None:
+            delimiter = self.delimiter
+        if error_level is None:
+            error_level = self.error_level
+        profile = _profile
+        if profile is not None:
+            start = default_timer()
+        result, issues, format = self._standardize_format(address, delimiter,
+                                                          error_level)
+        if issues and _diagnostics is not None:
+            _report(issues, address)
+        if profile is not None:
+            profile.lap('standardize', start)
+        return _with_extras(result, issues, format, with_issues, with_format)
+
+    def breakdown(self, address, delimiter = None, error_level = None,
+                  with_issues = False, with_format = False):
+        '''As breakdown().'''
+        if delimiter is None:
+            delimiter = self.delimiter
+        if error_level is None:
+            error_level = self.error_level
+        profile = _profile
+        if profile is not None:
+            start = default_timer()
+        parsed, issues, format = self._breakdown(address, delimiter,
+                                                 error_level)
+        if issues and _diagnostics is not None:
+            _report(issues, address)
+        if profile is not None:
+            profile.lap('breakdown', start)
+        return _with_extras(parsed, issues, format, with_issues, with_format)
+
+    def delivery_address_standardize(self, address, with_issues = False):
+        '''As delivery_address_standardize().'''
+        profile = _profile
+        if profile is None:
+            parts, issues = self._delivery_address_result(address)
+            if issues and _diagnostics is not None:
+                _report(issues, address)
+            result = _format_delivery_address(parts)
+        else:
+            start = first = default_timer()
+            parts, issues = self._delivery_address_result(address)
+            start = profile.lap('delivery_address', start)
+            if issues and _diagnostics is not None:
+                _report(issues, address)
+                start = default_timer()
+            result = _format_delivery_address(parts)
+            profile.lap('format', start)
+            profile.lap('delivery_address_standardize', first)
+        if with_issues:
+            return result, issues
+        return result
+
+    def last_line_standardize(self, last_line, divider = None,
+                              error_level = None, with_issues = False):
+        '''As last_line_standardize().'''
+        if divider is None:
+            divider = self.divider
+        if error_level is None:
+            error_level = self.error_level
+        profile = _profile
+        if profile is None:
+            parts, issues = self._last_line_result(last_line, divider,
+                                                   error_level)
+            if issues and _diagnostics is not None:
+                _report(issues, last_line)
+            result = _format_last_line(parts)
+        else:
+            start = first = default_timer()
+            parts, issues = self._last_line_result(last_line, divider,
+                                                   error_level)
+            start = profile.lap('last_line', start)
+            if issues and _diagnostics is not None:
+                _report(issues, last_line)
+                start = default_timer()
+            result = _format_last_line(parts)
+            profile.lap('format', start)
+            profile.lap('last_line_standardize', first)
+        if with_issues:
+            return result, issues
+        return result
+
+    def standardize_many(self, addresses, delimiter = None,
+                         error_level = None, part = "address",
+                         chunk_size = 0, with_issues = False):
+        '''As standardize_many(), the divider of the Standardizer 
+        being used for last lines unless a delimiter is given.'''
+        try:
+            function = getattr(self, _BATCH_FUNCTIONS[part])
+        except KeyError:
+            raise ValueError("Unknown part: "+part)
+        if delimiter is None:
+            if part == "last_line":
+                delimiter = self.divider
+            else:
+                delimiter = self.delimiter
+        if error_level is None:
+            error_level = self.error_level
+        results = _standardize_iter(addresses, function, delimiter,
+                                    error_level, with_issues)
+        if chunk_size > 0:
+            return _chunk_iter(results, chunk_size)
+        return results
+
+    def validate(self, address, delimiter = None):
+        '''As validate().'''
+        if delimiter is None:
+            delimiter = self.delimiter
+        return _validate(address, delimiter, self.tables)
+
+    def validate_many(self, addresses, delimiter = None):
+        '''As validate_many().'''
+        if delimiter is None:
+            delimiter = self.delimiter
+        tables = self.tables
+        for address in addresses:
+            yield _validate(address.rstrip('\r\n'), delimiter, tables)
+
+    def _standardize(self, address, delimiter, error_level):
+        result, issues, format = self._standardize_format(address, delimiter,
+                                                          error_level)
+        return result, issues
+
+    def _standardize_format(self, address, delimiter, error_level):
+        parsed, issues, format = self._breakdown(address, delimiter,
+                                                 error_level)
+        profile = _profile
+        if profile is None:
+            return parsed.format(), issues, format
+        start = default_timer()
+        result = parsed.format()
+        profile.lap('format', start)
+        return result, issues, format
+
+    def _breakdown(self, address, delimiter, error_level):
+        tables, cache = self.tables, self.get_cache()
+        profile = _profile
+        if profile is not None:
+            start = default_timer()
+        address = normalize(address, delimiter or '\n|,')
+        if profile is not None:
+            start = profile.lap('normalize', start)
+        delivery_address, last_line, format = _split_address(address,
+                                                             delimiter,
+                                                             tables)
+        # a comma left in the last line lies between the city and state
+        divider = ''
+        if ',' in last_line:
+            divider = ','
+        if profile is not None:
+            start = profile.lap('split', start)
+        delivery_address, issues = _delivery_address_cached(delivery_address,
+                                                            tables, cache)
+        if profile is not None:
+            start = profile.lap('delivery_address', start)
+        last_line, last_line_issues = _last_line_cached(last_line, divider,
+                                                        error_level, tables,
+                                                        cache)
+        if profile is not None:
+            profile.lap('last_line', start)
+        return (ParsedAddress._make(delivery_address + last_line),
+                issues + last_line_issues, format)
+
+    def _delivery_address_result(self, address):
+        return _delivery_address_cached(normalize(address), self.tables,
+                                        self.get_cache())
+
+    def _delivery_address(self, address, delimiter, error_level):
+        parts, issues = self._delivery_address_result(address)
+        return _format_delivery_address(parts), issues
+
+    def _last_line_result(self, last_line, divider, error_level):
+        return _last_line_cached(normalize(last_line, divider), divider,
+                                 error_level, self.tables, self.get_cache())
+
+    def _last_line(self, last_line, divider, error_level):
+        parts, issues = self._last_line_result(last_line, divider,
+                                               error_level)
+        return _format_last_line(parts), issues
+
+_standardizer = None
+
+def get_standardizer():
+    '''Returns the Standardizer used by the module functions, that of 
+    the Tables in use sharing the cache set, which is made again 
+    once either is changed.'''
+    global _standardizer
+    standardizer = _standardizer
+    if standardizer is None:
+        standardizer = _standardizer = Standardizer(cache = _cache)
+    return standardizer
+
+def standardize(address, delimiter = "", error_level = 0,
+                with_issues = False, with_format = False):
     '''Takes an address in string form as an argument and returns 
     a revised address in USPS standard format. The delimiter is 
     the character which lies between the street and city portions 
-    of the address. If none is provided, both a comma and a line 
-    return are tested. If the address cannot be broken down, a 
-    ValueError is raised.'''
-    pass
-#    if :
-#    else :
-#        throw PyException(Py.ValueError, "Unable to parse address from "+address)
-    
-def breakdown(address, delimiter = ""):
-    pass
-def delivery_address_standardize(address):
+    of the address. If none is provided, the address is split at 
+    a line return, a pipe or a comma, in that order, or else after 
+    its street suffix. If the address cannot be broken down, a 
+    ValueError is raised. With with_issues, a tuple of the issue 
+    codes found is returned along with the address, and with 
+    with_format, then the one of ADDRESS_FORMATS it was found in.'''
+    return (_standardizer or get_standardizer()).standardize(
+            address, delimiter, error_level, with_issues, with_format)
+
+def _with_extras(result, issues, format, with_issues, with_format):
+    if with_issues:
+        if with_format:
+            return result, issues, format
+        return result, issues
+    if with_format:
+        return result, format
+    return result
+
+# the formats in which _split_address() finds an address: its delivery 
+# address and last line are split at the given delimiter, or found from 
+# the end of an address of lines, pipe delimited fields or comma delimited 
+# fields, or between the street and city of an address with nothing but 
+# spaces between its parts
+ADDRESS_FORMATS = ('delimiter', 'newline', 'pipe', 'comma', 'space')
+
+def _split_address(address, delimiter, tables):
+    '''Splits a raw address into its delivery address and last line, 
+    returning them with the format found. With no delimiter given, 
+    the address is checked for a line return, then a pipe and then a 
+    comma, the first found naming its format; lines and pipe or comma 
+    delimited fields are all split from the end of the address by 
+    _split_delimited_address(), and an address with none of them is 
+    split after the suffix of its street.'''
+    if delimiter:
+        if delimiter in address:
+            delivery_address, last_line = address.split(delimiter, 1)
+            return delivery_address.strip(), last_line.strip(), 'delimiter'
+        raise ValueError("Unable to parse address from "+address)
+    if '\n' in address:
+        format = 'newline'
+    elif '|' in address:
+        format = 'pipe'
+    elif ',' in address:
+        format = 'comma'
+    else:
+        return _split_spaced_address(address, tables) + ('space',)
+    return _split_delimited_address(address, tables) + (format,)
+
+def _split_delimited_address(address, tables):
+    '''Splits an address of lines or of pipe or comma delimited fields 
+    at the start of its last line, which is found from the end: the 
+    zip, the state before it and then the city, which is the rest of 
+    the state's field or else the field before it. Any earlier line 
+    returns, pipes and commas lie within the delivery address, as 
+    before a secondary unit. A city sharing the first field with the 
+    delivery address is split from it after the suffix of the street, 
+    and if that fails the last field alone is the last line.'''
+    # the address is normalized, so its fields need only be stripped
+    fields = [field.strip() for field in
+              address.replace('\n', ',').replace('|', ',').split(',')]
+    fields = [field for field in fields if field]
+    if len(fields) < 2:
+        if not fields:
+            raise ValueError("Unable to parse address from "+address)
+        return _split_spaced_address(fields[0], tables)
+    last = fields.pop().split()
+    zip_length = 1
+    if len(last) > 1 and _is_split_postal_code(last[-2], last[-1], tables):
+        zip_length = 2
+    if len(last) == zip_length and len(fields) > 1:
+        # the zip is a field of its own
+        last = fields.pop().split() + last
+    words = last[:-zip_length]
+    state_length = (_state_length(words, tables.state_trie, 0) or
+                    _misspelled_state_length(words, tables, 0) or 1)
+    if state_length < len(words):
+        last_line = ' '.join(last)
+    elif len(fields) > 1:
+        last_line = fields.pop() + ', ' + ' '.join(last)
+    else:
+        try:
+            delivery_address, last_line = _split_spaced_address(
+                    fields[0] + ' ' + ' '.join(last), tables)
+        except ValueError:
+            # no city is left for the last line
+            last_line = ' '.join(last)
+        else:
+            city = last_line.split()[:-len(last)]
+            return delivery_address, ' '.join(city) + ', ' + ' '.join(last)
+    return ' '.join(fields), last_line
+
+def _split_spaced_address(address, tables):
+    '''Splits an address with no delimiter after the first suffix 
+    following a word of the street name, after the number and any 
+    predirectional, and the postdirectional and secondary unit which 
+    follow it, leaving at least the zip, the 
+    state ending the address and a word of the city for the last 
+    line.'''
+    upper = address.split()
+    zip_length = 1
+    if len(upper) > 2 and _is_split_postal_code(upper[-2], upper[-1],
+                                                tables):
+        zip_length = 2
+    state_length = _state_length(upper[:-zip_length],
+                                 tables.state_trie) or 1
+    # the last word which may end the delivery address
+    limit = len(upper) - state_length - zip_length - 1
+    street = 1
+    if len(upper) > 1 and upper[1] in tables.directional_lookup:
+        street = 2
+    for end in xrange(street + 2, limit + 1):
+        if upper[end - 1] in tables.suffix_lookup:
+            break
+    else:
+        # the directional may be the street name, as in '101 NORTH ST'
+        end = street + 1
+        if not (street == 2 and end <= limit and
+                upper[end - 1] in tables.suffix_lookup):
+            raise ValueError("Unable to parse address from "+address)
+    if end < limit and upper[end] in tables.directional_lookup:
+        end += 1
+    if end < limit and upper[end] in tables.unit_lookup:
+        end += 1
+        if end < limit and upper[end] == '#':
+            end += 1
+        if end < limit and (len(upper[end]) <= 2 or
+                            not upper[end].isalpha()):
+            end += 1
+    elif end + 1 < limit and upper[end] == '#':
+        end += 2
+    return ' '.join(upper[:end]), ' '.join(upper[end:])
+
+class ParsedAddress(namedtuple('ParsedAddress', 'primary_number '
+        'predirectional street_name suffix postdirectional unit_designator '
+        'unit city state zip5 zip4')):
+    '''An address broken down into its USPS standard parts, those 
+    not present being None. It is a tuple without an instance dict, 
+    so that millions can be held in memory.'''
+    __slots__ = ()
+
+    def delivery_address(self):
+        '''Returns the delivery address in USPS approved format.'''
+        return _format_delivery_address(self[:7])
+
+    def last_line(self):
+        '''Returns the last line in USPS approved format.'''
+        return _format_last_line(self[7:])
+
+    def format(self):
+        '''Returns the address in USPS approved format, the delivery 
+        address and last line separated by a line return.'''
+        return (_format_delivery_address(self[:7]) + '\n' +
+                _format_last_line(self[7:]))
+
+def breakdown(address, delimiter = "", error_level = 0, with_issues = False,
+              with_format = False):
+    '''Takes an address in string form as for standardize() and 
+    returns it broken down into a ParsedAddress, from which 
+    standardize() formats its result. With with_issues and 
+    with_format, the issue codes found and the format are returned 
+    along with it as for standardize().'''
+    return (_standardizer or get_standardizer()).breakdown(
+            address, delimiter, error_level, with_issues, with_format)
+
+def _format_delivery_address(parts):
+    return ' '.join([part for part in parts if part])
+
+def _format_last_line(parts):
+    city, state, zip5, zip4 = parts
+    if zip4:
+        return city+' '+state+' '+zip5+'-'+zip4
+    return city+' '+state+' '+zip5
+
+def delivery_address_standardize(address, with_issues = False):
     '''Takes the first line of an address containing the primary 
     address number, predirectional, street name, suffix, 
     postdirectional, secondary address indentifier, and secondary 
     address as a single space delimited string formatted like: 
     '101 W MAIN ST S APT 12'.  
     Only the primary address number and  street name are required.
-    Returns a string in USPS approved format.'''
-    
-    address = address.rsplit(' ')
-    address_number = address[0]
-    if +   
+    Returns a string in USPS approved format. With with_issues, a 
+    tuple of the issue codes found is returned along with it.'''
+    return (_standardizer or get_standardizer()
+            ).delivery_address_standardize(address, with_issues)
 
-def last_line_standardize(last_line, divider = "", error_level = 0):
+def _delivery_address_cached(address, tables, cache):
+    if cache is None:
+        return _parse_delivery_address(address, tables)
+    key = ('delivery', tables.version, tables.countries, address)
+    result = cache.get(key, _MISSING)
+    if result is _MISSING:
+        result = _parse_delivery_address(address, tables)
+        cache.put(key, result)
+    return result
+
+def _parse_delivery_address(address, tables):
+    '''Splits a delivery address into its primary number, 
+    predirectional, street name, suffix, postdirectional, secondary 
+    unit designator and secondary unit, abbreviating each part 
+    found and giving None for those which are not, and returns them 
+    with the issue codes found. A misspelled suffix or unit 
+    designator is corrected if no suffix is recognized. If the 
+    address does not match, a ValueError is raised.'''
+    profile = _profile
+    if profile is not None:
+        start = default_timer()
+    match = tables.full_address.match(address)
+    if profile is not None:
+        start = profile.lap('tokenize', start)
+    if not match:
+        raise ValueError("Unable to parse delivery address from "+address)
+    issues = ()
+    if match.group('suffix') is None:
+        match, issues = _correct_delivery_address(address, match, tables)
+        if profile is not None:
+            profile.lap('correct', start)
+    (number, predirectional, street, suffix, postdirectional, designator,
+     unit, pound_unit) = match.groups()
+    if predirectional:
+        predirectional = tables.directional_lookup[predirectional]
+    if suffix:
+        suffix = tables.suffix_lookup[suffix]
+    if postdirectional:
+        postdirectional = tables.directional_lookup[postdirectional]
+    if designator:
+        designator = tables.unit_lookup[designator]
+    elif pound_unit:
+        designator, unit = '#', pound_unit
+    pool = _interning
+    if pool is not None:
+        number, street = pool.intern(number), pool.intern(street)
+        if unit:
+            unit = pool.intern(unit)
+    return (number, predirectional, street, suffix, postdirectional,
+            designator, unit), issues
+
+def _correct_delivery_address(address, match, tables):
+    '''Corrects a misspelled unit designator followed by a unit 
+    number at the end of the street name, and then a misspelled 
+    suffix ending the street name, returning the match of the 
+    corrected address and the corrections made.'''
+    words = match.group('street').split()
+    end = len(words)
+    issues = ()
+    if (end > 2 and match.group('designator') is None and
+            match.group('pound_unit') is None and
+            not words[-1].isalpha()):
+        designator = tables.fuzzy_index('unit').correct(words[-2])
+        if designator is not None:
+            words[-2] = designator
+            end -= 2
+            issues = (CORRECTED_UNIT,)
+    if end > 1 and words[end - 1] not in tables.suffix_lookup:
+        suffix = tables.fuzzy_index('suffix').correct(words[end - 1])
+        if suffix is not None:
+            words[end - 1] = suffix
+            issues += (CORRECTED_SUFFIX,)
+    if not issues:
+        return match, issues
+    address = (address[:match.start('street')] + ' '.join(words) +
+               address[match.end('street'):])
+    return tables.full_address.match(address), issues
+
+def last_line_standardize(last_line, divider = "", error_level = 0,
+                          with_issues = False):
     '''Takes the last line of an address containing the city, 
     state and zip with an optional divider or a space between 
     city and state and spaces between state and zip and 
-    returns a USPS approved last line.'''
-    city,state,zip = '','',''
-    if divider:
-         city,state = last_line.rsplit(divider)
-         state,zip = state.strip().rsplit(" ")
-    else:
-        last_line = last_line.rsplit(" ")
-        # assumes that the last two elements delimited by spaces are the state
-        # and zip, and that everything before is the city.
-        city,state,zip = last_line[:-2][0],last_line[-2],last_line[-1] 
+    returns a USPS approved last line. A bad zip code, an 
+    unrecognized state or a zip code which is not in the state 
+    raises a ValueError if error_level is 1, and is otherwise 
+    reported to the diagnostics sink. With 
+    with_issues, a tuple of the issue codes found is returned 
+    along with the last line.'''
+    return (_standardizer or get_standardizer()).last_line_standardize(
+            last_line, divider, error_level, with_issues)
+
+def _last_line_cached(last_line, divider, error_level, tables, cache):
+    if cache is None:
+        return _parse_last_line(last_line, divider, error_level, tables)
+    key = ('last_line', tables.version, tables.countries, last_line, divider,
+           error_level)
+    result = cache.get(key, _MISSING)
+    if result is _MISSING:
+        result = _parse_last_line(last_line, divider, error_level, tables)
+        cache.put(key, result)
+    return result
+
+def _parse_last_line(last_line, divider, error_level, tables):
+    '''Splits a last line into its city, state, zip5 and zip4, the 
+    state abbreviated, returning them with the issue codes found. 
+    A Canadian postal code is returned whole as the zip5.'''
+    profile = _profile
+    if profile is not None:
+        start = default_timer()
+    postal_districts = tables.postal_districts
+    city, state, zip = _split_last_line(last_line, divider, tables)
+    if profile is not None:
+        start = profile.lap('last_line_split', start)
+    issues = ()
     #check zip
-    if not( zip[:5].isnumeric() and (len(zip) == 5 or (len(zip) == 10 and 
-            zip[5] == '-' and zip[6:].isnumeric()))):
-        if error_level == 0:
-            print "WARNING: Bad zip code:",zip
-        elif error_level == 1:
-            raise ValueError, "Bad zip code: "+zip
-        else:
-            print "WARNING: Bad zip code:",zip
-    
-    city,state = city.upper(),state.upper()
+    if ZIP_CODE.match(zip):
+        zip5, zip4 = zip[:5], zip[6:] or None
+    elif postal_districts is not None and POSTAL_CODE.match(zip):
+        zip5, zip4 = zip[:3]+' '+zip[-3:], None
+    else:
+        if error_level == 1:
+            raise ValueError("Bad zip code: "+zip)
+        issues = (BAD_ZIP,)
+        zip5, zip4 = zip, None
+    if profile is not None:
+        start = profile.lap('zip', start)
     
     #check and abbreviate state
+    code, state_issues = _state_code(state, tables)
+    if code is not None:
+        state = code
+    issues += state_issues
+    if code is None:
+        if error_level == 1:
+            raise ValueError("Unrecognized state: "+state)
+        issues += (UNKNOWN_STATE,)
+    if profile is not None:
+        start = profile.lap('state', start)
+    if code is not None and BAD_ZIP not in issues:
+        #check that the zip is served in the state
+        zip3_states = _zip_states(zip5, tables)
+        if zip3_states is not None and code not in zip3_states:
+            if error_level == 1:
+                raise ValueError("Zip code "+zip+" is not in "+state)
+            issues += (ZIP_STATE_MISMATCH,)
+        if profile is not None:
+            start = profile.lap('zip3', start)
+    if (BAD_ZIP not in issues and tables.city_aliases is not None and
+            len(zip5) == 5):
+        city = tables.city_aliases.preferred(zip5, city)
+        if profile is not None:
+            profile.lap('city', start)
+    pool = _interning
+    if pool is not None:
+        city, zip5 = pool.intern(city), pool.intern(zip5)
+    return (city, state, zip5, zip4), issues
+
+def _split_last_line(last_line, divider, tables):
+    '''Splits a last line into its city, state and zip as found, 
+    raising a ValueError if it holds no state and zip.'''
+    if divider:
+         city, found, state = last_line.rpartition(divider)
+         state = state.split()
+         # a last line needs at least a state and zip
+         if not found or len(state) < 2:
+             raise ValueError("Unable to parse last line from "+last_line)
+         city = city.strip()
+         zip = state.pop()
+         if _is_split_postal_code(state[-1], zip, tables):
+             zip = state.pop()+' '+zip
+         return city, ' '.join(state), zip
+    words = last_line.split()
+    if len(words) < 2:
+        raise ValueError("Unable to parse last line from "+last_line)
+    # the zip is the last word and the state is the longest state name
+    # or abbreviation ending the words before it, leaving at least one
+    # word for the city; an unrecognized state is taken to be one word.
+    zip = words.pop()
+    if words and _is_split_postal_code(words[-1], zip, tables):
+        zip = words.pop()+' '+zip
+    state_length = (_state_length(words, tables.state_trie) or
+                    _misspelled_state_length(words, tables) or 1)
+    return (' '.join(words[:-state_length]),
+            ' '.join(words[-state_length:]), zip)
+
+def _state_code(state, tables):
+    '''Returns the code of a state name or code, or None if it is not 
+    recognized, with the issue codes of any correction made.'''
     if len(state) > 2:
+        code = tables.state_name_index.get(state)
+        if code is None:
+            code = tables.fuzzy_index('state').correct(state)
+            if code is not None:
+                return code, (CORRECTED_STATE,)
+        return code, ()
+    if state in tables.state_codes:
+        return tables.state_lookup[state], ()
+    return None, ()
+
+def _zip_states(zip5, tables):
+    '''Returns the states a valid zip5 or postal code is served in, 
+    or None if they are not known.'''
+    if len(zip5) == 5:
+        return tables.zip3_states[int(zip5[:3])]
+    # the first letter of a postal code is its district
+    return tables.postal_districts.get(zip5[0])
+
+def _is_split_postal_code(first, last, tables):
+    '''Returns whether two words are the halves of a Canadian postal 
+    code the tables accept.'''
+    return (tables.postal_districts is not None and len(last) == 3 and
+            POSTAL_CODE.match(first+last) is not None)
+
+def _misspelled_state_length(words, tables, keep = 1):
+    '''Returns the number of words, up to the four of the longest state 
+    names and without taking the first keep words, of the longest 
+    misspelled state name ending the list of words, or 0 if none 
+    does.'''
+    state_index = tables.fuzzy_index('state')
+    for length in xrange(min(4, len(words) - keep), 0, -1):
+        if state_index.correct(' '.join(words[-length:])) is not None:
+            return length
+    return 0
+
+# the methods of a Standardizer applied to each record of a batch, which 
+# return the result with its issue codes and leave reporting them to the 
+# caller
+_BATCH_FUNCTIONS = {"address": "_standardize",
+                    "delivery": "_delivery_address",
+                    "last_line": "_last_line"}
+
+def standardize_many(addresses, delimiter = "", error_level = 0,
+                     part = "address", chunk_size = 0, with_issues = False):
+    '''Takes any iterable of raw addresses, including an open file, 
+    and lazily yields the standardized form of each one in input 
+    order, holding only one record at a time. part selects the 
+    function applied to each item: "address" for standardize(), 
+    "delivery" for delivery_address_standardize() or "last_line" 
+    for last_line_standardize(), which is given delimiter as its 
+    divider. Trailing line endings are removed before parsing. If 
+    a chunk_size is given, lists of up to chunk_size results are 
+    yielded instead of single strings. A record which cannot be 
+    parsed gives None and the UNPARSEABLE issue rather than ending 
+    the batch, unless error_level is 1. With with_issues, each 
+    result is a tuple of the string and its issue codes.'''
+    return get_standardizer().standardize_many(addresses, delimiter,
+                                               error_level, part, chunk_size,
+                                               with_issues)
+
+def _standardize_iter(addresses, function, delimiter, error_level,
+                      with_issues):
+    diagnostics = _diagnostics
+    for address in addresses:
+        address = address.rstrip('\r\n')
         try:
-            state = STATE_TO_ABBREVIATION[state]
-        except KeyError:
-            if error_level == 0:
-                print "WARNING: Unrecognized state:",state
-            elif error_level == 1:
-                raise ValueError, "Unrecognized state: "+state
-            else:
-                print "WARNING: Unrecognized state:",state
+            result, issues = function(address, delimiter, error_level)
+        except ValueError:
+            if error_level == 1:
+                raise
+            result, issues = None, (UNPARSEABLE,)
+        if issues and diagnostics is not None:
+            diagnostics.report(issues, address)
+        if with_issues:
+            yield result, issues
+        else:
+            yield result
+
+def _chunk_iter(results, chunk_size):
+    chunk = list(islice(results, chunk_size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(results, chunk_size))
+
+def validate(address, delimiter = ""):
+    '''Checks an address as standardize() does, returning the issue 
+    mask of the issue codes it would give instead of the address: 
+    a bad zip code, an unrecognized state, a zip code not in the 
+    state and misspelled parts, along with UNKNOWN_SUFFIX for a 
+    street with no suffix, which is not an issue when 
+    standardizing. An address which cannot be parsed has the 
+    UNPARSEABLE bit rather than raising a ValueError, and a clean 
+    address gives 0. Nothing is reported to the diagnostics sink.'''
+    return (_standardizer or get_standardizer()).validate(address,
+                                                          delimiter)
+
+def validate_many(addresses, delimiter = ""):
+    '''Takes any iterable of raw addresses, including an open file, 
+    and lazily yields the issue mask of each as for validate(), 
+    after removing trailing line endings.'''
+    return get_standardizer().validate_many(addresses, delimiter)
+
+def _validate(address, delimiter, tables):
+    '''Classifies an address with the split and lookups standardize() 
+    uses, so that the two agree, but without abbreviating its parts, 
+    looking up city aliases or building the result.'''
+    address = normalize(address, delimiter or '\n|,')
+    try:
+        delivery_address, last_line, format = _split_address(address,
+                                                             delimiter,
+                                                             tables)
+        # a comma left in the last line lies between the city and state
+        divider = ''
+        if ',' in last_line:
+            divider = ','
+        city, state, zip = _split_last_line(last_line, divider, tables)
+    except ValueError:
+        return ISSUE_BITS[UNPARSEABLE]
+    match = tables.full_address.match(delivery_address)
+    if not match:
+        return ISSUE_BITS[UNPARSEABLE]
+    mask = 0
+    if match.group('suffix') is None:
+        match, issues = _correct_delivery_address(delivery_address, match,
+                                                  tables)
+        if issues:
+            mask = issue_mask(issues)
+        if match.group('suffix') is None:
+            mask |= ISSUE_BITS[UNKNOWN_SUFFIX]
+    if ZIP_CODE.match(zip):
+        zip5 = zip[:5]
+    elif tables.postal_districts is not None and POSTAL_CODE.match(zip):
+        zip5 = zip
     else:
-        if STATE_TO_ABBREVIATION.keys().count(state) == 0:
-            if error_level == 0:
-                print "WARNING: Unrecognized state:",state
-            elif error_level == 1:
-                raise ValueError, "Unrecognized state: "+state
+        mask |= ISSUE_BITS[BAD_ZIP]
+        zip5 = None
+    code, issues = _state_code(state, tables)
+    if issues:
+        mask |= ISSUE_BITS[CORRECTED_STATE]
+    if code is None:
+        return mask | ISSUE_BITS[UNKNOWN_STATE]
+    if zip5 is not None:
+        zip3_states = _zip_states(zip5, tables)
+        if zip3_states is not None and code not in zip3_states:
+            mask |= ISSUE_BITS[ZIP_STATE_MISMATCH]
+    return mask
+
+def standardize_column(values, part = "last_line", delimiter = "",
+                       error_level = 0):
+    '''Takes a column of raw values of one part of an address, as for 
+    standardize_many(), in any sequence including a NumPy object 
+    array or a pyarrow array, and returns the column of their 
+    standardized forms and an array of their issue masks. Each 
+    distinct value is standardized only once and its result shared 
+    by every row which holds it. Missing values, taken to be any 
+    which are not strings such as None or NaN, give None; values 
+    which raise a ValueError give None and the UNPARSEABLE issue. 
+    If the values are a NumPy array, NumPy arrays are returned.'''
+    try:
+        function = getattr(get_standardizer(), _BATCH_FUNCTIONS[part])
+    except KeyError:
+        raise ValueError("Unknown part: "+part)
+    numpy = sys.modules.get('numpy')
+    is_numpy = numpy is not None and isinstance(values, numpy.ndarray)
+    if hasattr(values, 'to_pylist'):
+        values = values.to_pylist()
+    uniques, counts, rows = _factorize(values)
+    diagnostics = _diagnostics
+    results, masks = [], array('H')
+    for value, count in izip(uniques, counts):
+        # None, NaN and any other value which is not a string is missing
+        if not isinstance(value, basestring):
+            result, issues = None, ()
+        else:
+            try:
+                result, issues = function(value, delimiter, error_level)
+            except ValueError:
+                if error_level == 1:
+                    raise
+                result, issues = None, (UNPARSEABLE,)
+        if issues and diagnostics is not None:
+            for _ in xrange(count):
+                diagnostics.report(issues, value)
+        results.append(result)
+        masks.append(issue_mask(issues))
+    if is_numpy:
+        rows = numpy.frombuffer(rows, dtype = numpy.int32)
+        return (numpy.array(results, dtype = object)[rows],
+                numpy.frombuffer(masks, dtype = numpy.uint16)[rows])
+    return [results[row] for row in rows], array('H', [masks[row]
+                                                       for row in rows])
+
+def _factorize(values):
+    '''Returns the distinct values in order of first appearance, how 
+    many times each appears, and for each value the index of its 
+    distinct value.'''
+    index, uniques, counts, rows = {}, [], [], array('i')
+    for value in values:
+        row = index.get(value)
+        if row is None:
+            row = index[value] = len(uniques)
+            uniques.append(value)
+            counts.append(1)
+        else:
+            counts[row] += 1
+        rows.append(row)
+    return uniques, counts, rows
+
+class ResultStore(object):
+    '''An on-disk store of the results of standardize_file(), kept in 
+    the SQLite database at path, so that a later run over mostly the 
+    same records standardizes only those it has not seen. Each result 
+    is keyed on a fingerprint of the raw address and the options 
+    which affect it, and is only reused while the module and table 
+    versions it was computed with are still in use. Counts the 
+    records skipped and recomputed.'''
+
+    # most fingerprints looked up in one query, under SQLite's limit 
+    # on the parameters of a statement
+    _LOOKUP_SIZE = 500
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.text_factory = str
+        with self._connection:
+            self._connection.execute(
+                    'CREATE TABLE IF NOT EXISTS results '
+                    '(fingerprint BLOB PRIMARY KEY, version TEXT NOT NULL, '
+                    'result TEXT, issues TEXT NOT NULL)')
+        self.skipped = self.recomputed = 0
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self._connection.execute(
+                'SELECT COUNT(*) FROM results').fetchone()[0]
+
+    @staticmethod
+    def version():
+        '''Returns the version of the rules results are computed with, 
+        the module version and that of the tables in use.'''
+        return '%s/%s' % (__version__, get_tables().version)
+
+    @staticmethod
+    def fingerprint(address, options):
+        '''Returns the fingerprint of a raw address standardized with 
+        the given (delimiter, error_level, part) options.'''
+        return hashlib.md5('\0'.join(map(str, options) + [address])).digest()
+
+    def lookup(self, addresses, options):
+        '''Returns the fingerprints of the addresses and the list of 
+        their stored (result, issues) pairs, with None for those which 
+        must be recomputed.'''
+        fingerprints = [self.fingerprint(address, options)
+                        for address in addresses]
+        version = self.version()
+        found = {}
+        for i in xrange(0, len(fingerprints), self._LOOKUP_SIZE):
+            batch = fingerprints[i:i + self._LOOKUP_SIZE]
+            for fingerprint, result, issues in self._connection.execute(
+                    'SELECT fingerprint, result, issues FROM results '
+                    'WHERE version = ? AND fingerprint IN (%s)'
+                    % ','.join('?' * len(batch)),
+                    [version] + map(sqlite3.Binary, batch)):
+                found[str(fingerprint)] = (result,
+                                           tuple(issues.split(',')) if issues
+                                           else ())
+        results = [found.get(fingerprint) for fingerprint in fingerprints]
+        recomputed = results.count(None)
+        self.recomputed += recomputed
+        self.skipped += len(results) - recomputed
+        return fingerprints, results
+
+    def update(self, fingerprints, results):
+        '''Stores the (result, issues) pairs computed for the 
+        fingerprints, replacing any left by other versions.'''
+        version = self.version()
+        with self._connection:
+            self._connection.executemany(
+                    'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                    [(sqlite3.Binary(fingerprint), version, result,
+                      ','.join(issues))
+                     for fingerprint, (result, issues)
+                     in izip(fingerprints, results)])
+
+    def prune(self):
+        '''Removes the results computed with other versions, returning 
+        how many there were.'''
+        with self._connection:
+            return self._connection.execute(
+                    'DELETE FROM results WHERE version != ?',
+                    (self.version(),)).rowcount
+
+    def stats(self):
+        '''Returns the number of records skipped and recomputed as a 
+        dict.'''
+        return {'skipped': self.skipped, 'recomputed': self.recomputed}
+
+FILE_FORMATS = {"lines": None, "csv": "excel", "tsv": "excel-tab"}
+
+def standardize_file(input, output, format = "lines", column = 0,
+                     header = False, delimiter = "", error_level = 0,
+                     part = "address", workers = None, chunk_size = 1000,
+                     cache_size = 0, store = None):
+    '''Standardizes every address in the open input file and writes 
+    the results to the open output file in input order. format is 
+    "lines" for one address per line, or "csv" or "tsv" for 
+    delimited rows whose field at the given column is replaced by 
+    its standardized form; with header, the first row is copied 
+    unchanged. The two lines of a standardized address are joined 
+    with a comma. Records are sent in chunks of chunk_size to a 
+    pool of worker processes, one per CPU unless given, each of 
+    which builds its tables once and may keep an LRUCache of 
+    cache_size results. delimiter, error_level and part are as for 
+    standardize_many(). Issues found by the workers are reported 
+    to the diagnostics sink of this process. Addresses which cannot 
+    be standardized are written as empty fields and reported as 
+    UNPARSEABLE, unless error_level is 1, when the ValueError is 
+    raised; rows too short to hold the column are padded out to it. 
+    A regular file is read through a memory map, and its lines are 
+    standardized as bytes, those which are not ASCII being decoded 
+    by normalize() and written back as UTF-8. Given a ResultStore, only the 
+    records it holds no result for are standardized, and their 
+    results are added to it. Returns the number of records 
+    written and the number which could not be standardized.'''
+    if part not in _BATCH_FUNCTIONS:
+        raise ValueError("Unknown part: "+part)
+    try:
+        dialect = FILE_FORMATS[format]
+    except KeyError:
+        raise ValueError("Unknown file format: "+format)
+    lines = _input_lines(input)
+    if dialect:
+        rows = csv.reader(lines, dialect)
+        writer = csv.writer(output, dialect)
+        if header:
+            for row in islice(rows, 1):
+                writer.writerow(row)
+        write = writer.writerow
+    else:
+        rows = (line.rstrip('\r\n') for line in lines)
+        write = lambda line: output.write(line + '\n')
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    options = (delimiter, error_level, part)
+    if not dialect:
+        column = None
+    diagnostics = _diagnostics
+    records = failures = 0
+    for rows, results in _standardize_chunks(rows, column, options, workers,
+                                             chunk_size, cache_size, store):
+        for row, (result, issues) in zip(rows, results):
+            if dialect and column >= len(row):
+                # a short row is padded out to its address field
+                row.extend([''] * (column + 1 - len(row)))
+            if issues and diagnostics is not None:
+                diagnostics.report(issues, row[column] if dialect else row)
+            if result is None:
+                failures += 1
+                result = ''
+            elif isinstance(result, unicode):
+                result = result.encode('utf-8')
+            if dialect:
+                row[column] = result
             else:
-                print "WARNING: Unrecognized state:",state
-    return city+' '+state+' '+zip
-    
-            
-            
-        
\ No newline at end of file
+                row = result
+            write(row)
+        records += len(rows)
+    return records, failures
+
+def _input_lines(input):
+    '''Yields the lines of the open input file from its position on, 
+    sliced from a memory map of it when it is a regular file rather 
+    than copied through the file object's buffer. A file opened 
+    with universal newlines has every line ending, a lone "\\r" 
+    included, read as "\\n", as reading the file would.'''
+    universal = 'U' in getattr(input, 'mode', '')
+    try:
+        if not stat.S_ISREG(os.fstat(input.fileno()).st_mode):
+            raise ValueError("Not a regular file")
+        mapped = mmap.mmap(input.fileno(), 0, access = mmap.ACCESS_READ)
+    except (AttributeError, EnvironmentError, ValueError):
+        for line in input:
+            yield line
+        return
+    try:
+        mapped.seek(input.tell())
+        for line in iter(mapped.readline, ''):
+            if universal and '\r' in line:
+                # a line with carriage returns may be several lines
+                for line in line.replace('\r\n', '\n').replace(
+                        '\r', '\n').splitlines(True):
+                    yield line
+            else:
+                yield line
+    finally:
+        mapped.close()
+
+def _standardize_chunks(rows, column, options, workers, chunk_size,
+                        cache_size, store = None):
+    '''Yields each chunk of rows with the list of its results, keeping 
+    only a few chunks per worker in flight at once. Given a store, 
+    only the addresses it has no result for are sent to be 
+    standardized.'''
+    chunks = iter(lambda: list(islice(rows, chunk_size)), [])
+    jobs = (_chunk_job(chunk, column, options, store) for chunk in chunks)
+    if workers < 2:
+        for chunk, addresses, stored in jobs:
+            yield chunk, _finish_chunk(_standardize_chunk(
+                    (addresses,) + options), stored, store)
+        return
+    # build the tables before forking so that the workers share them
+    get_tables().build()
+    # the workers time their chunks in profiles of their own, which are 
+    # sent back with the results and added to this process's
+    profile = _profile
+    task = _standardize_chunk if profile is None else _profiled_chunk
+    pool = multiprocessing.Pool(workers, _init_worker,
+                                (cache_size, profile is not None))
+    try:
+        pending = deque()
+        for chunk, addresses, stored in jobs:
+            result = None
+            if addresses:
+                result = pool.apply_async(task, ((addresses,) + options,))
+            pending.append((chunk, result, stored))
+            if len(pending) >= workers * 4:
+                chunk, result, stored = pending.popleft()
+                yield chunk, _finish_chunk(_chunk_results(result, profile),
+                                           stored, store)
+        while pending:
+            chunk, result, stored = pending.popleft()
+            yield chunk, _finish_chunk(_chunk_results(result, profile),
+                                       stored, store)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def _chunk_job(chunk, column, options, store):
+    '''Returns a chunk with the addresses of it to standardize and, 
+    given a store, the fingerprints and stored results of all of 
+    them.'''
+    addresses = _chunk_addresses(chunk, column)
+    if store is None:
+        return chunk, addresses, None
+    fingerprints, results = store.lookup(addresses, options)
+    return chunk, [address for address, result in izip(addresses, results)
+                   if result is None], (fingerprints, results)
+
+def _finish_chunk(computed, stored, store):
+    '''Fills the results missing from a store with those computed, 
+    adding them to the store, and returns the results of the whole 
+    chunk.'''
+    if stored is None:
+        return computed
+    fingerprints, results = stored
+    missing = [i for i, result in enumerate(results) if result is None]
+    for i, result in izip(missing, computed or ()):
+        results[i] = result
+    if missing:
+        store.update([fingerprints[i] for i in missing],
+                     [results[i] for i in missing])
+    return results
+
+def _chunk_addresses(chunk, column):
+    if column is None:
+        return chunk
+    return [row[column] if column < len(row) else '' for row in chunk]
+
+def _init_worker(cache_size, profiled = False):
+    set_cache(LRUCache(cache_size) if cache_size > 0 else None)
+    set_diagnostics(None)
+    set_profile(Profile() if profiled else None)
+
+def _profiled_chunk(args):
+    '''Standardizes a chunk as _standardize_chunk() does in a worker 
+    keeping a Profile, returning the results with the snapshot of the 
+    time spent on them.'''
+    results = _standardize_chunk(args)
+    snapshot = _profile.snapshot()
+    _profile.clear()
+    return results, snapshot
+
+def _chunk_results(result, profile):
+    if result is None:
+        return None
+    if profile is None:
+        return result.get()
+    results, snapshot = result.get()
+    profile.merge(snapshot)
+    return results
+
+def _standardize_chunk(args):
+    '''Standardizes a list of addresses in a worker, returning each 
+    result with its issue codes and giving None and the UNPARSEABLE 
+    issue for those which raise a ValueError, unless error_level is 
+    1.'''
+    addresses, delimiter, error_level, part = args
+    function = getattr(get_standardizer(), _BATCH_FUNCTIONS[part])
+    results = []
+    for address in addresses:
+        try:
+            result, issues = function(address, delimiter, error_level)
+        except ValueError:
+            if error_level == 1:
+                raise
+            result, issues = None, (UNPARSEABLE,)
+        else:
+            if part == "address":
+                result = result.replace('\n', ', ')
+        results.append((result, issues))
+    return results
+
+def main(argv = None):
+    '''Command line entry point, run as python -m AddressFormat.'''
+    import argparse
+    parser = argparse.ArgumentParser(prog = "python -m AddressFormat",
+            description = "Convert a file of raw addresses into USPS "
+                          "approved address format.")
+    parser.add_argument("input", nargs = "?", default = "-",
+            help = "file of addresses, or - for standard input")
+    parser.add_argument("-o", "--output", default = "-",
+            help = "file to write to, or - for standard output")
+    parser.add_argument("-f", "--format", choices = sorted(FILE_FORMATS),
+            help = "input format, guessed from the file extension "
+                   "if not given")
+    parser.add_argument("-c", "--column", type = int, default = 0,
+            help = "address column of csv and tsv files")
+    parser.add_argument("--header", action = "store_true",
+            help = "copy the first row of csv and tsv files unchanged")
+    parser.add_argument("-p", "--part", default = "address",
+            choices = sorted(_BATCH_FUNCTIONS),
+            help = "which part of an address each record holds")
+    parser.add_argument("-d", "--delimiter", default = "",
+            help = "delimiter between the street and city, or between "
+                   "the city and state of last lines")
+    parser.add_argument("-e", "--error-level", type = int, default = 0,
+            choices = (0, 1, 2))
+    parser.add_argument("-j", "--workers", type = int,
+            help = "number of worker processes, one per CPU by default")
+    parser.add_argument("--chunk-size", type = int, default = 1000)
+    parser.add_argument("--cache-size", type = int, default = 0,
+            help = "results cached per worker, none by default")
+    parser.add_argument("--store",
+            help = "SQLite file of results kept between runs, so that "
+                   "only new or changed records are standardized")
+    parser.add_argument("--tables", choices = table_versions(),
+            help = "version of the lookup tables, the newest by default")
+    args = parser.parse_args(argv)
+    if args.tables:
+        use_tables(args.tables)
+    format = args.format
+    if format is None:
+        format = args.input.rsplit('.', 1)[-1].lower()
+        if format not in FILE_FORMATS:
+            format = "lines"
+    mode = 'rb' if FILE_FORMATS[format] else 'rU'
+    input = sys.stdin if args.input == "-" else open(args.input, mode)
+    output = (sys.stdout if args.output == "-"
+              else open(args.output, 'wb' if FILE_FORMATS[format] else 'w'))
+    store = ResultStore(args.store) if args.store else None
+    try:
+        records, failures = standardize_file(input, output, format,
+                args.column, args.header, args.delimiter, args.error_level,
+                args.part, args.workers, args.chunk_size, args.cache_size,
+                store)
+    finally:
+        if store is not None:
+            store.close()
+        if output is not sys.stdout:
+            output.close()
+        if input is not sys.stdin:
+            input.close()
+    if store is not None:
+        sys.stderr.write("%(skipped)d records skipped, %(recomputed)d "
+                         "recomputed\n" % store.stats())
+    if failures:
+        sys.stderr.write("%d of %d addresses could not be standardized\n"
+                         % (failures, records))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""
+AddressJobs runs long standardization jobs as independent shards which
+can be resumed after a crash, and merges their results back into input
+order.
+
+    python -m AddressJobs addresses.txt -o standardized.txt --job job/
+
+The input is partitioned into shards by the ZIP3 prefix of each address,
+or by a hash of it, in a job directory holding a manifest.json. Each
+shard is checkpointed by a .done file once its output is complete, so a
+job which dies is resumed by running it again, and machines sharing the
+job directory can each take a stripe of the shards with --stripe.
+"""
+
+import csv
+import heapq
+import json
+import multiprocessing
+import os
+import re
+import sys
+import zlib
+
+import AddressFormat
+
+MANIFEST = 'manifest.json'
+PARTITIONS = ('zip3', 'hash')
+# the zip code ending an address, whose first three digits pick its shard
+_TRAILING_ZIP = re.compile('([0-9]{3})[0-9]{2}(?:-[0-9]{4})?\\s*$')
+
+def shard_of(address, shards, partition = "zip3"):
+    '''Returns the shard of a raw address. Partitioned by "zip3",
+    the ZIP3 prefixes are divided into shards ranges, and addresses
+    with no zip code are spread by hash like any with "hash".'''
+    if partition == "zip3":
+        match = _TRAILING_ZIP.search(address)
+        if match:
+            return int(match.group(1)) * shards // 1000
+    return (zlib.crc32(address) & 0xffffffff) % shards
+
+def create_job(input, directory, shards = 64, partition = "zip3",
+               delimiter = "", error_level = 0, part = "address"):
+    '''Partitions the addresses of the open input file, one per line,
+    into shards under directory and writes the job's manifest, which
+    is returned. The rows of a shard are tab delimited with their
+    line number. The manifest is written last, so a job is only
+    created once it has been partitioned completely; if the directory
+    already holds a manifest, that is returned and nothing is done.'''
+    if partition not in PARTITIONS:
+        raise ValueError("Unknown partition: "+partition)
+    manifest = load_manifest(directory)
+    if manifest is not None:
+        return manifest
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    names = ['shard-%04d' % shard for shard in xrange(shards)]
+    files = [open(os.path.join(directory, name + '.in'), 'wb')
+             for name in names]
+    counts = [0] * shards
+    try:
+        writers = [csv.writer(file, 'excel-tab') for file in files]
+        for row, address in enumerate(input):
+            address = address.rstrip('\r\n')
+            shard = shard_of(address, shards, partition)
+            writers[shard].writerow((row, address))
+            counts[shard] += 1
+    finally:
+        for file in files:
+            file.close()
+    manifest = {'partition': partition,
+                'tables': AddressFormat.get_tables().version,
+                'options': {'delimiter': delimiter,
+                            'error_level': error_level,
+                            'part': part},
+                'records': sum(counts),
+                'shards': [{'name': name, 'records': count}
+                           for name, count in zip(names, counts)]}
+    _write_json(os.path.join(directory, MANIFEST), manifest)
+    return manifest
+
+def load_manifest(directory):
+    '''Returns the manifest of the job in directory, or None if it
+    has not been created.'''
+    try:
+        with open(os.path.join(directory, MANIFEST)) as manifest:
+            return json.load(manifest)
+    except IOError:
+        return None
+
+def shard_status(directory, shard):
+    '''Returns the checkpoint of a shard of the manifest, its records
+    and failures as a dict, or None if it is not done.'''
+    try:
+        with open(os.path.join(directory, shard['name'] + '.done')) as done:
+            return json.load(done)
+    except IOError:
+        return None
+
+def run_job(directory, workers = None, stripe = (0, 1), cache_size = 0):
+    '''Standardizes every shard of the job in directory which is not
+    done yet, on a pool of worker processes, one per CPU unless
+    given. stripe is (index, count) to take only the shards whose
+    number modulo count is index, so that several machines sharing
+    the directory each run their own. Returns the number of shards
+    run, records and failures.'''
+    manifest = load_manifest(directory)
+    if manifest is None:
+        raise ValueError("No job in "+directory)
+    index, count = stripe
+    shards = [shard for number, shard in enumerate(manifest['shards'])
+              if number % count == index and
+                 shard_status(directory, shard) is None]
+    tasks = [(directory, shard['name'], manifest['tables'],
+              manifest['options'], cache_size) for shard in shards]
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers < 2 or len(tasks) < 2:
+        statuses = map(_run_shard, tasks)
+    else:
+        # build the tables before forking so that the workers share them
+        AddressFormat.get_tables().build()
+        pool = multiprocessing.Pool(min(workers, len(tasks)))
+        try:
+            statuses = pool.map(_run_shard, tasks, 1)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+    return (len(statuses), sum(status['records'] for status in statuses),
+            sum(status['failures'] for status in statuses))
+
+def _run_shard(args):
+    '''Standardizes one shard into its output, checkpointing it with
+    a .done file once the output is complete, and returns the
+    checkpoint. A shard left part way is started over.'''
+    directory, name, tables, options, cache_size = args
+    if AddressFormat.get_tables().version != tables:
+        AddressFormat.use_tables(tables)
+    path = os.path.join(directory, name)
+    with open(path + '.in', 'rb') as input:
+        with open(path + '.tmp', 'wb') as output:
+            records, failures = AddressFormat.standardize_file(input, output,
+                    "tsv", 1, False, options['delimiter'],
+                    options['error_level'], options['part'], 1,
+                    cache_size = cache_size)
+    os.rename(path + '.tmp', path + '.out')
+    status = {'records': records, 'failures': failures}
+    _write_json(path + '.done', status)
+    return status
+
+def merge_job(directory, output):
+    '''Writes the results of every shard of the finished job in
+    directory to the open output file, one per line in input order,
+    those which could not be standardized as empty lines. Returns
+    the number of records and failures.'''
+    manifest = load_manifest(directory)
+    if manifest is None:
+        raise ValueError("No job in "+directory)
+    failures = 0
+    for shard in manifest['shards']:
+        status = shard_status(directory, shard)
+        if status is None:
+            raise ValueError("Shard %s is not done" % shard['name'])
+        failures += status['failures']
+    files = [open(os.path.join(directory, shard['name'] + '.out'), 'rb')
+             for shard in manifest['shards']]
+    records = 0
+    try:
+        for row, result in heapq.merge(*[_shard_rows(file)
+                                         for file in files]):
+            output.write(result + '\n')
+            records += 1
+    finally:
+        for file in files:
+            file.close()
+    return records, failures
+
+def _shard_rows(file):
+    for row, result in csv.reader(file, 'excel-tab'):
+        yield int(row), result
+
+def _write_json(path, value):
+    '''Writes value to path through a temporary file, so that path
+    holds either nothing or all of it.'''
+    with open(path + '.tmp', 'w') as file:
+        json.dump(value, file, indent = 2, sort_keys = True)
+        file.flush()
+        os.fsync(file.fileno())
+    os.rename(path + '.tmp', path)
+
+def main(argv = None):
+    '''Command line entry point, run as python -m AddressJobs.'''
+    import argparse
+    parser = argparse.ArgumentParser(prog = "python -m AddressJobs",
+            description = "Standardize a file of one address per line as "
+                          "a sharded job which resumes where it stopped "
+                          "when run again.")
+    parser.add_argument("input", nargs = "?",
+            help = "file of addresses, needed until the job is created")
+    parser.add_argument("-o", "--output",
+            help = "file to merge the results into once every shard is "
+                   "done, or - for standard output")
+    parser.add_argument("--job", required = True,
+            help = "job directory, shared by every machine running it")
+    parser.add_argument("-n", "--shards", type = int, default = 64)
+    parser.add_argument("--partition", choices = PARTITIONS,
+            default = "zip3")
+    parser.add_argument("-d", "--delimiter", default = "",
+            help = "delimiter between the street and city")
+    parser.add_argument("-e", "--error-level", type = int, default = 0,
+            choices = (0, 1, 2))
+    parser.add_argument("-p", "--part", default = "address",
+            choices = ("address", "delivery", "last_line"),
+            help = "which part of an address each line holds")
+    parser.add_argument("-j", "--workers", type = int,
+            help = "number of worker processes, one per CPU by default")
+    parser.add_argument("--stripe", default = "0/1",
+            help = "index/count of the stripe of shards to run here")
+    parser.add_argument("--cache-size", type = int, default = 0)
+    args = parser.parse_args(argv)
+    if load_manifest(args.job) is None:
+        if args.input is None:
+            parser.error("the input is needed to create the job")
+        input = sys.stdin if args.input == "-" else open(args.input, 'rU')
+        try:
+            create_job(input, args.job, args.shards, args.partition,
+                       args.delimiter, args.error_level, args.part)
+        finally:
+            if input is not sys.stdin:
+                input.close()
+    index, count = [int(part) for part in args.stripe.split('/')]
+    shards, records, failures = run_job(args.job, args.workers,
+                                        (index, count), args.cache_size)
+    sys.stderr.write("%d shards run, %d records, %d failures\n"
+                     % (shards, records, failures))
+    if args.output:
+        manifest = load_manifest(args.job)
+        if any(shard_status(args.job, shard) is None
+               for shard in manifest['shards']):
+            sys.stderr.write("shards of other stripes are not done yet\n")
+            return 1
+        output = (sys.stdout if args.output == "-"
+                  else open(args.output + '.tmp', 'w'))
+        try:
+            records, failures = merge_job(args.job, output)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        if output is not sys.stdout:
+            os.rename(args.output + '.tmp', args.output)
+        sys.stderr.write("%d records merged, %d could not be standardized\n"
+                         % (records, failures))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,305 @@
+"""
+AddressServer runs AddressFormat as a local HTTP service speaking JSON,
+so that several programs can share one process and its warm tables and
+cache.
+
+    python -m AddressServer --port 8080
+
+Single addresses are POSTed as {"address": ..., "delimiter": ...,
+"error_level": ...} to /standardize, /breakdown, /delivery or
+/last_line, the delimiter, one character if given, being the divider
+for /last_line.
+Concurrent requests are gathered into micro-batches which one worker
+thread standardizes together. /bulk?part=<part> takes NDJSON, one JSON
+string or object per line, and answers with one JSON object per line.
+"""
+
+import BaseHTTPServer
+import json
+import Queue
+import SocketServer
+import sys
+import threading
+from timeit import default_timer
+from urlparse import parse_qs, urlparse
+
+import AddressFormat
+
+def _standardize(address, delimiter, error_level):
+    return AddressFormat.standardize(address, delimiter, error_level,
+                                     with_issues = True)
+
+def _breakdown(address, delimiter, error_level):
+    parsed, issues = AddressFormat.breakdown(address, delimiter, error_level,
+                                             with_issues = True)
+    return parsed._asdict(), issues
+
+def _delivery(address, delimiter, error_level):
+    return AddressFormat.delivery_address_standardize(address,
+                                                      with_issues = True)
+
+def _last_line(address, delimiter, error_level):
+    return AddressFormat.last_line_standardize(address, delimiter,
+                                               error_level,
+                                               with_issues = True)
+
+PARTS = {'standardize': _standardize,
+         'breakdown': _breakdown,
+         'delivery': _delivery,
+         'last_line': _last_line}
+
+# the part of standardize_many() which serves each part in micro-batches
+_BATCH_PARTS = {'standardize': "address",
+                'delivery': "delivery",
+                'last_line': "last_line"}
+
+def _parse_request(request):
+    '''Returns the address, delimiter and error_level of a request,
+    raising a ValueError if any of them is not valid. The delimiter
+    must be a single ASCII character, or empty, so that clients
+    cannot add to the translation tables normalize() keeps for
+    each.'''
+    if isinstance(request, dict):
+        address = request.get('address')
+        delimiter = request.get('delimiter', "")
+        error_level = request.get('error_level', 0)
+    else:
+        address, delimiter, error_level = request, "", 0
+    if not isinstance(address, basestring):
+        raise ValueError("No address given")
+    if (not isinstance(delimiter, basestring) or len(delimiter) > 1 or
+            delimiter > '\x7f'):
+        raise ValueError("Delimiter must be one ASCII character")
+    if not isinstance(error_level, (int, long)):
+        raise ValueError("Error level must be an integer")
+    return address, delimiter, error_level
+
+def process(part, request):
+    '''Standardizes one request, a raw address string or a dict with
+    an "address" and optionally a "delimiter" and "error_level",
+    returning the dict to send back: the "result" and its "issues",
+    or the "error" which prevented it. No exception is raised.'''
+    try:
+        address, delimiter, error_level = _parse_request(request)
+        result, issues = PARTS[part](address, delimiter, error_level)
+    except ValueError, error:
+        return {'error': str(error)}
+    except Exception, error:
+        return {'error': repr(error)}
+    return {'result': result, 'issues': list(issues)}
+
+class _Pending(object):
+    __slots__ = ('part', 'requests', 'responses', 'done')
+
+    def __init__(self, part, requests):
+        self.part = part
+        self.requests = requests
+        self.responses = None
+        self.done = threading.Event()
+
+class MicroBatcher(object):
+    '''Gathers requests submitted from many threads and processes them
+    on one worker thread in batches of up to max_batch, waiting at
+    most max_delay seconds after the first request of a batch for
+    the rest to arrive. Since only the worker thread standardizes,
+    the cache and diagnostics sink are never used concurrently.'''
+
+    def __init__(self, max_batch = 64, max_delay = 0.002):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = self.requests = 0
+        self._queue = Queue.Queue()
+        worker = threading.Thread(target = self._run)
+        worker.daemon = True
+        worker.start()
+
+    def submit(self, part, request):
+        '''Queues a request and returns its response once its batch
+        has been processed.'''
+        return self.submit_many(part, [request])[0]
+
+    def submit_many(self, part, requests):
+        '''Queues a list of requests to be processed together and
+        returns the list of their responses.'''
+        pending = _Pending(part, requests)
+        self._queue.put(pending)
+        pending.done.wait()
+        return pending.responses
+
+    def _run(self):
+        get = self._queue.get
+        while True:
+            batch = [get()]
+            deadline = default_timer() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - default_timer()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(get(True, remaining))
+                except Queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch):
+        self.batches += 1
+        # the requests of parts standardize_many() serves are grouped by
+        # their options and each group standardized in one call, leaving
+        # requests which must raise their error to process()
+        groups = {}
+        for pending in batch:
+            self.requests += len(pending.requests)
+            pending.responses = [None] * len(pending.requests)
+            many_part = _BATCH_PARTS.get(pending.part)
+            for i, request in enumerate(pending.requests):
+                if many_part is not None:
+                    try:
+                        address, delimiter, error_level = _parse_request(
+                                request)
+                    except ValueError:
+                        pass
+                    else:
+                        # standardize_many() would strip a line ending
+                        if (error_level != 1 and
+                                not address.endswith(('\r', '\n'))):
+                            groups.setdefault(
+                                    (many_part, delimiter, error_level), []
+                                    ).append((pending, i, address))
+                            continue
+                pending.responses[i] = process(pending.part, request)
+        for (part, delimiter, error_level), members in groups.iteritems():
+            try:
+                results = list(AddressFormat.standardize_many(
+                        [address for pending, i, address in members],
+                        delimiter, error_level, part, with_issues = True))
+            except Exception:
+                results = [(None, ())] * len(members)
+            for (pending, i, address), (result, issues) in zip(members,
+                                                               results):
+                if result is None:
+                    # a record which failed is processed again alone for
+                    # its error
+                    pending.responses[i] = process(pending.part,
+                                                   pending.requests[i])
+                else:
+                    pending.responses[i] = {'result': result,
+                                            'issues': list(issues)}
+        for pending in batch:
+            pending.done.set()
+
+    def stats(self):
+        '''Returns the number of batches and requests processed and
+        the mean batch size as a dict.'''
+        return {'batches': self.batches, 'requests': self.requests,
+                'mean_batch': (float(self.requests) / self.batches
+                               if self.batches else 0.0)}
+
+class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''Answers POSTs to /<part> and /bulk, and GETs of /stats.'''
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/stats':
+            return self._send(404, {'error': "Not found"})
+        stats = {'batcher': self.server.batcher.stats()}
+        cache = AddressFormat.get_cache()
+        if cache is not None:
+            stats['cache'] = cache.stats()
+        diagnostics = AddressFormat.get_diagnostics()
+        if diagnostics is not None:
+            stats['issues'] = diagnostics.stats()
+        self._send(200, stats)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        part = url.path.strip('/')
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if part == 'bulk':
+            part = parse_qs(url.query).get('part', ['standardize'])[0]
+            if part not in PARTS:
+                return self._send(404, {'error': "Unknown part: "+part})
+            return self._send_bulk(part, body)
+        if part not in PARTS:
+            return self._send(404, {'error': "Not found"})
+        try:
+            request = json.loads(body)
+        except ValueError:
+            return self._send(400, {'error': "Body is not JSON"})
+        response = self.server.batcher.submit(part, request)
+        self._send(422 if 'error' in response else 200, response)
+
+    def _send_bulk(self, part, body):
+        responses, requests = [], []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                requests.append(json.loads(line))
+            except ValueError:
+                responses.append({'error': "Line is not JSON"})
+            else:
+                responses.append(None)
+        processed = iter(self.server.batcher.submit_many(part, requests))
+        lines = [json.dumps(response or next(processed))
+                 for response in responses]
+        self._send_body(200, 'application/x-ndjson',
+                        '\n'.join(lines) + '\n' if lines else '')
+
+    def _send(self, status, response):
+        self._send_body(status, 'application/json', json.dumps(response))
+
+    def _send_body(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format,
+                                                              *args)
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    '''An HTTP server answering each connection on its own thread and
+    standardizing single addresses through a shared MicroBatcher.'''
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address = ('127.0.0.1', 8080), max_batch = 64,
+                 max_delay = 0.002, verbose = False):
+        BaseHTTPServer.HTTPServer.__init__(self, address, RequestHandler)
+        self.batcher = MicroBatcher(max_batch, max_delay)
+        self.verbose = verbose
+
+def main(argv = None):
+    '''Command line entry point, run as python -m AddressServer.'''
+    import argparse
+    parser = argparse.ArgumentParser(prog = "python -m AddressServer",
+            description = "Serve AddressFormat over HTTP and JSON.")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("-p", "--port", type = int, default = 8080)
+    parser.add_argument("--max-batch", type = int, default = 64,
+            help = "most requests standardized in one batch")
+    parser.add_argument("--max-delay", type = float, default = 0.002,
+            help = "seconds to wait for a batch to fill")
+    parser.add_argument("--cache-size", type = int, default = 0,
+            help = "results to cache, none by default")
+    parser.add_argument("-v", "--verbose", action = "store_true",
+            help = "log each request")
+    args = parser.parse_args(argv)
+    if args.cache_size > 0:
+        AddressFormat.set_cache(AddressFormat.LRUCache(args.cache_size))
+    AddressFormat.set_diagnostics(AddressFormat.Diagnostics())
+    server = Server((args.host, args.port), args.max_batch, args.max_delay,
+                    args.verbose)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
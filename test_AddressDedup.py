@@ -0,0 +1,65 @@
+"""
+Behaviour tests of AddressDedup, run from the top of the repository with
+
+    python -m unittest discover
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import AddressBenchmark
+import AddressDedup
+import AddressFormat
+
+class ClusterTest(unittest.TestCase):
+    '''Duplicates share the index of their first occurrence as their
+    cluster, however many runs the rows are spilled and merged in.'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertClusters(self, addresses, **options):
+        expected, firsts = [], {}
+        for row, address in enumerate(addresses):
+            try:
+                key = AddressDedup.canonical_key(AddressFormat.breakdown(
+                        address.rstrip('\r\n')))
+            except ValueError:
+                expected.append(row)
+            else:
+                expected.append(firsts.setdefault(key, row))
+        self.assertEqual(list(AddressDedup.cluster_ids(
+                addresses, directory = self.directory, **options)), expected)
+        self.assertEqual(os.listdir(self.directory), [])
+        return expected
+
+    def test_duplicates(self):
+        clusters = self.assertClusters(
+                ['1 Main St Apt 4, Chicago IL 60601\n',
+                 'NEW YORK 10001\n',
+                 '1 MAIN STREET # 4\nCHICAGO, IL 60601\n',
+                 '2 Oak Ave, Chicago IL 60601\n',
+                 '1 main st apt 4, chicago il 60601\n',
+                 '1 Main St Apt 5, Chicago IL 60601\n',
+                 '\n',
+                 '2 Oak Avenue, Chicago, Illinois 60601\n'])
+        self.assertEqual(clusters, [0, 1, 0, 3, 0, 5, 6, 3])
+
+    def test_spill_and_merge(self):
+        records = list(AddressBenchmark.generate_addresses(300, seed = 3))
+        addresses = [delivery_address+', '+last_line
+                     for delivery_address, last_line in records]
+        addresses += [address.upper() for address in addresses[::3]]
+        addresses.insert(50, 'NEW YORK 10001')
+        in_memory = self.assertClusters(addresses)
+        self.assertEqual(self.assertClusters(addresses, max_records = 7,
+                                             fan_in = 2), in_memory)
+        self.assertTrue(len(set(in_memory)) < len(addresses))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,384 @@
+"""
+Behaviour tests of AddressFormat, run from the top of the repository with
+
+    python -m unittest discover
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+from StringIO import StringIO
+
+import AddressBenchmark
+import AddressFormat
+
+class EmptyLineTest(unittest.TestCase):
+    '''Blank and truncated input raises a ValueError, which every
+    batch path turns into a failed record, never another exception.'''
+
+    def test_empty_last_line(self):
+        for last_line, divider in (('', ''), (' ', ''), ('', ','),
+                                   ('60601', ''), ('CHICAGO,', ','),
+                                   ('CHICAGO, 60601', ','),
+                                   ('CHICAGO IL 60601', ',')):
+            self.assertRaises(ValueError, AddressFormat.last_line_standardize,
+                              last_line, divider)
+
+    def test_truncated_address(self):
+        for address in ('', '1 MAIN ST,', '1 MAIN ST\n', '1 MAIN ST|',
+                        ',', '\n', '1 MAIN ST, CHICAGO,'):
+            self.assertRaises(ValueError, AddressFormat.standardize, address)
+
+    def test_divider_left_in_city(self):
+        self.assertEqual(AddressFormat.last_line_standardize(
+                'CHICAGO , IL 60601', ','), 'CHICAGO IL 60601')
+
+class StandardizeManyTest(unittest.TestCase):
+    '''A record which cannot be parsed fails alone, leaving the rest
+    of the batch to be standardized.'''
+
+    def test_unparseable_record(self):
+        addresses = ['1 Main St, Chicago IL 60601\n', 'NEW YORK 10001\n',
+                     '\n', '2 Oak Ave, Chicago IL 60601\n']
+        self.assertEqual(list(AddressFormat.standardize_many(
+                addresses, with_issues = True)),
+                [('1 MAIN ST\nCHICAGO IL 60601', ()),
+                 (None, (AddressFormat.UNPARSEABLE,)),
+                 (None, (AddressFormat.UNPARSEABLE,)),
+                 ('2 OAK AVE\nCHICAGO IL 60601', ())])
+        self.assertEqual(list(AddressFormat.standardize_many(
+                ['', 'CHICAGO IL 60601'], part = "last_line",
+                chunk_size = 2)), [[None, 'CHICAGO IL 60601']])
+
+    def test_error_level(self):
+        self.assertRaises(ValueError, list, AddressFormat.standardize_many(
+                ['NEW YORK 10001'], error_level = 1))
+
+class StandardizeColumnTest(unittest.TestCase):
+    '''Values which are not strings are missing, and values which
+    cannot be parsed fail alone.'''
+
+    def test_missing_and_unparseable_values(self):
+        results, masks = AddressFormat.standardize_column(
+                ['CHICAGO IL 60601', float('nan'), None, 5, '', '60601',
+                 'CHICAGO IL 60601'])
+        self.assertEqual(results, ['CHICAGO IL 60601', None, None, None,
+                                   None, None, 'CHICAGO IL 60601'])
+        unparseable = AddressFormat.ISSUE_BITS[AddressFormat.UNPARSEABLE]
+        self.assertEqual(list(masks), [0, 0, 0, 0, unparseable, unparseable,
+                                       0])
+
+    def test_numpy_column(self):
+        try:
+            import numpy
+        except ImportError:
+            raise unittest.SkipTest("numpy is not installed")
+        results, masks = AddressFormat.standardize_column(numpy.array(
+                ['1 Main St, Chicago IL 60601', numpy.nan, ''],
+                dtype = object), part = "address")
+        self.assertEqual(list(results),
+                         ['1 MAIN ST\nCHICAGO IL 60601', None, None])
+        self.assertEqual(masks.dtype, numpy.uint16)
+
+class StandardizeFileTest(unittest.TestCase):
+    '''Rows which cannot be standardized are written as empty fields
+    and counted, never ending the file.'''
+
+    def test_short_row(self):
+        output = StringIO()
+        self.assertEqual(AddressFormat.standardize_file(
+                StringIO('id,addr\n1,"1 Main St, Chicago IL 60601"\n2\n'),
+                output, "csv", 1, header = True, workers = 1), (2, 1))
+        self.assertEqual(output.getvalue().splitlines(),
+                         ['id,addr', '1,"1 MAIN ST, CHICAGO IL 60601"', '2,'])
+
+    def test_unparseable_line(self):
+        output = StringIO()
+        self.assertEqual(AddressFormat.standardize_file(
+                StringIO('NEW YORK 10001\n\n1 Main St, Chicago IL 60601\n'),
+                output, workers = 1), (3, 2))
+        self.assertEqual(output.getvalue(),
+                         '\n\n1 MAIN ST, CHICAGO IL 60601\n')
+
+    def test_line_endings(self):
+        handle, path = tempfile.mkstemp()
+        try:
+            os.write(handle, '1 Main St, Chicago IL 60601\r'
+                             '2 Oak Ave, Boston MA 02101\r\n'
+                             '3 Elm St, Chicago IL 60601')
+            os.close(handle)
+            with open(path, 'rU') as input:
+                output = StringIO()
+                self.assertEqual(AddressFormat.standardize_file(
+                        input, output, workers = 1), (3, 0))
+        finally:
+            os.remove(path)
+        self.assertEqual(output.getvalue().splitlines(),
+                         ['1 MAIN ST, CHICAGO IL 60601',
+                          '2 OAK AVE, BOSTON MA 02101',
+                          '3 ELM ST, CHICAGO IL 60601'])
+
+    def test_error_level(self):
+        for workers in (1, 2):
+            self.assertRaises(ValueError, AddressFormat.standardize_file,
+                              StringIO('1 Main St, Chicago IL 6060\n'),
+                              StringIO(), error_level = 1,
+                              workers = workers)
+
+    def test_unparseable_reported(self):
+        diagnostics = AddressFormat.Diagnostics()
+        previous = AddressFormat.set_diagnostics(diagnostics)
+        try:
+            AddressFormat.standardize_file(StringIO('NEW YORK 10001\n\n'),
+                                           StringIO(), workers = 1)
+        finally:
+            AddressFormat.set_diagnostics(previous)
+        self.assertEqual(diagnostics.stats(),
+                         {AddressFormat.UNPARSEABLE: 2})
+
+class ResultStoreTest(unittest.TestCase):
+    '''A store skips the records it holds results for, giving the same
+    output as standardizing them again.'''
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix = '.db')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def run_file(self, store, text, **options):
+        output = StringIO()
+        counts = AddressFormat.standardize_file(StringIO(text), output,
+                                                workers = 1, store = store,
+                                                **options)
+        return counts, output.getvalue()
+
+    def test_skip_and_recompute(self):
+        text = ('1 Main St, Chicago IL 60601\nNEW YORK 10001\n'
+                '2 Oak Ave, Boston MA 02101\n')
+        with AddressFormat.ResultStore(self.path) as store:
+            first = self.run_file(store, text)
+            self.assertEqual(store.stats(), {'skipped': 0, 'recomputed': 3})
+            self.assertEqual(len(store), 3)
+        with AddressFormat.ResultStore(self.path) as store:
+            self.assertEqual(self.run_file(store, text), first)
+            self.assertEqual(store.stats(), {'skipped': 3, 'recomputed': 0})
+            self.assertEqual(self.run_file(
+                    store, text + '3 Elm St, Chicago IL 60601\n')[0], (4, 1))
+            self.assertEqual(store.stats(), {'skipped': 6, 'recomputed': 1})
+            # results computed with other options are not reused
+            self.run_file(store, text, part = "delivery")
+            self.assertEqual(store.stats(), {'skipped': 6, 'recomputed': 4})
+            self.assertEqual(store.prune(), 0)
+        self.assertEqual(first, ((3, 1), '1 MAIN ST, CHICAGO IL 60601\n\n'
+                                          '2 OAK AVE, BOSTON MA 02101\n'))
+
+class SplitAddressTest(unittest.TestCase):
+    '''An address is split at the start of its last line, found from
+    the zip, state and city ending it, in each format detected.'''
+
+    def assertSplit(self, address, delivery_address, last_line, format):
+        self.assertEqual(AddressFormat.standardize(address,
+                                                   with_format = True),
+                         (delivery_address + '\n' + last_line, format))
+
+    def test_formats(self):
+        self.assertSplit('1 Main St, Chicago IL 60601', '1 MAIN ST',
+                         'CHICAGO IL 60601', 'comma')
+        self.assertSplit('1 Main St\nChicago, IL 60601', '1 MAIN ST',
+                         'CHICAGO IL 60601', 'newline')
+        self.assertSplit('1 Main St|Chicago|IL|60601', '1 MAIN ST',
+                         'CHICAGO IL 60601', 'pipe')
+        self.assertSplit('1 Main St Chicago IL 60601', '1 MAIN ST',
+                         'CHICAGO IL 60601', 'space')
+        self.assertEqual(AddressFormat.standardize(
+                '1 Main St; Chicago, IL 60601', ';', with_format = True),
+                ('1 MAIN ST\nCHICAGO IL 60601', 'delimiter'))
+
+    def test_city_sharing_the_street_field(self):
+        self.assertSplit('500 Oak Ln Fort Worth, TX 76102', '500 OAK LN',
+                         'FORT WORTH TX 76102', 'comma')
+        self.assertSplit('10 Elm St Apt 5 Kansas City, MO 64101',
+                         '10 ELM ST APT 5', 'KANSAS CITY MO 64101', 'comma')
+
+    def test_secondary_unit_field(self):
+        for address in ('1 Main St, Apt 4, Chicago IL 60601',
+                        '1 Main St, Apt 4, Chicago, IL 60601',
+                        '1 Main St\nApt 4\nChicago IL 60601'):
+            self.assertEqual(AddressFormat.standardize(address),
+                             '1 MAIN ST APT 4\nCHICAGO IL 60601')
+
+    def test_pipe_fields(self):
+        self.assertSplit('1 Main St|Chicago IL|60601', '1 MAIN ST',
+                         'CHICAGO IL 60601', 'pipe')
+        self.assertSplit('1 Main St|Apt 4|Chicago IL|60601',
+                         '1 MAIN ST APT 4', 'CHICAGO IL 60601', 'pipe')
+        self.assertSplit('1 Main St|Apt 4|Chicago|IL 60601',
+                         '1 MAIN ST APT 4', 'CHICAGO IL 60601', 'pipe')
+        self.assertSplit('1 Main St Chicago|IL 60601', '1 MAIN ST',
+                         'CHICAGO IL 60601', 'pipe')
+
+    def test_zip_field(self):
+        self.assertSplit('1 Main St, Chicago, IL, 60601', '1 MAIN ST',
+                         'CHICAGO IL 60601', 'comma')
+
+    def test_misspelled_state_field(self):
+        self.assertEqual(AddressFormat.standardize(
+                '1 Pine St, Madison Armed Forces Middle Eaast 09060',
+                with_issues = True),
+                ('1 PINE ST\nMADISON AE 09060',
+                 (AddressFormat.CORRECTED_STATE,)))
+        self.assertEqual(AddressFormat.standardize(
+                '1 Pine St, Madison, Armed Forces Middle Eaast 09060'),
+                '1 PINE ST\nMADISON AE 09060')
+
+class FuzzyCorrectionTest(unittest.TestCase):
+    '''Street names with no suffix are left as they are, and only
+    misspellings of whole names are corrected.'''
+
+    def test_suffixless_street_names(self):
+        for address in ('1 CAMINO REAL', '100 EL CAMINO REAL', '1 RUE MAIN',
+                        '500 BROADWAY', '1 AVENUE OF THE AMERICAS',
+                        '12 CENTRAL', '5 OCEAN', '3 HIGHLAND', '9 PARK',
+                        '4 LAKESHORE', '7 RIVERSIDE', '2 KINGSWAY',
+                        '8 EMBARCADERO', '6 WILLOW'):
+            self.assertEqual(AddressFormat.delivery_address_standardize(
+                    address, with_issues = True), (address, ()))
+
+    def test_misspelled_suffix(self):
+        for address, corrected in (('1 MAIN BOULVARD', '1 MAIN BLVD'),
+                                   ('1 OAK STREEET', '1 OAK ST'),
+                                   ('1 OAK AVENEU', '1 OAK AVE')):
+            self.assertEqual(AddressFormat.delivery_address_standardize(
+                    address, with_issues = True),
+                    (corrected, (AddressFormat.CORRECTED_SUFFIX,)))
+
+    def test_short_words_are_not_corrected(self):
+        index = AddressFormat.fuzzy_index('suffix')
+        for word in ('REAL', 'MAIN', 'RADL', 'MTIN', 'LAEN'):
+            self.assertEqual(index.correct(word), None)
+
+    def test_correction_within_allowed_distance(self):
+        # RADIL is one edit from RADIAL, REALL too far from any name
+        index = AddressFormat.fuzzy_index('suffix')
+        self.assertEqual(index.correct('RADIL'), 'RADL')
+        self.assertEqual(index.correct('REALL'), None)
+
+class StandardizerTest(unittest.TestCase):
+    '''A Standardizer splits addresses at its delimiter and last lines
+    at its divider, each only where no other is given.'''
+
+    def test_divider(self):
+        standardizer = AddressFormat.Standardizer(delimiter = ';')
+        self.assertEqual(standardizer.divider, '')
+        self.assertEqual(standardizer.last_line_standardize(
+                'CHICAGO IL 60601'), 'CHICAGO IL 60601')
+        self.assertEqual(list(standardizer.standardize_many(
+                ['CHICAGO IL 60601'], part = "last_line")),
+                ['CHICAGO IL 60601'])
+        self.assertEqual(standardizer.standardize(
+                '1 Main St; Chicago IL 60601'), '1 MAIN ST\nCHICAGO IL 60601')
+        standardizer = AddressFormat.Standardizer(divider = ',')
+        self.assertEqual(standardizer.last_line_standardize(
+                'Fort Worth, Texas 76102'), 'FORT WORTH TX 76102')
+        self.assertEqual(list(standardizer.standardize_many(
+                ['Fort Worth, Texas 76102'], part = "last_line")),
+                ['FORT WORTH TX 76102'])
+        self.assertEqual(standardizer.last_line_standardize(
+                'Chicago IL 60601', ''), 'CHICAGO IL 60601')
+
+    def test_immutable(self):
+        standardizer = AddressFormat.Standardizer()
+        self.assertRaises(AttributeError, setattr, standardizer, 'divider',
+                          ',')
+
+class CacheTest(unittest.TestCase):
+    '''A cache may be shared by threads and by Standardizers with
+    different tables.'''
+
+    def test_threads(self):
+        cache = AddressFormat.LRUCache(50)
+        previous = AddressFormat.set_cache(cache)
+        errors = []
+        def run(start):
+            try:
+                for i in xrange(2000):
+                    AddressFormat.last_line_standardize(
+                            'CHICAGO IL %05d' % (60600 + (start + i) % 200))
+            except Exception, error:
+                errors.append(error)
+        threads = [threading.Thread(target = run, args = (i * 25,))
+                   for i in xrange(8)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            AddressFormat.set_cache(previous)
+        self.assertEqual(errors, [])
+        self.assertTrue(len(cache) <= 50)
+        self.assertEqual(cache.hits + cache.misses, 16000)
+
+    def test_tables(self):
+        cache = AddressFormat.LRUCache(100)
+        canada = AddressFormat.Standardizer(AddressFormat.Tables(
+                countries = ('US', 'CA')), cache = cache)
+        us = AddressFormat.Standardizer(AddressFormat.Tables(
+                countries = ('US',)), cache = cache)
+        self.assertEqual(canada.last_line_standardize(
+                'Toronto ON M5V 2T6', with_issues = True),
+                ('TORONTO ON M5V 2T6', ()))
+        self.assertEqual(us.last_line_standardize(
+                'Toronto ON M5V 2T6', with_issues = True)[1],
+                (AddressFormat.BAD_ZIP, AddressFormat.UNKNOWN_STATE))
+
+class ValidateParityTest(unittest.TestCase):
+    '''validate() gives the issues standardize() would, apart from
+    UNKNOWN_SUFFIX, which only validate() reports.'''
+
+    def assertParity(self, address):
+        try:
+            issues = AddressFormat.standardize(address, with_issues = True)[1]
+        except ValueError:
+            issues = (AddressFormat.UNPARSEABLE,)
+        self.assertEqual(AddressFormat.validate(address) &
+                         ~AddressFormat.ISSUE_BITS[
+                                 AddressFormat.UNKNOWN_SUFFIX],
+                         AddressFormat.issue_mask(issues), address)
+
+    def test_generated_addresses(self):
+        for delivery_address, last_line in AddressBenchmark.generate_addresses(
+                5000, seed = 7, missing_divider_rate = 0.3):
+            self.assertParity(delivery_address+', '+last_line)
+            self.assertParity(delivery_address+'\n'+last_line)
+            self.assertParity(delivery_address+' '+last_line)
+            self.assertParity(delivery_address+'|'+
+                              last_line.replace(', ', '|'))
+
+    def test_reported_addresses(self):
+        self.assertEqual(AddressFormat.validate(
+                '1 Main St, Apt 4, Chicago, IL 60601'), 0)
+        self.assertEqual(AddressFormat.validate('NEW YORK 10001'),
+                         AddressFormat.ISSUE_BITS[AddressFormat.UNPARSEABLE])
+        self.assertEqual(AddressFormat.validate('1 Main, Chicago IL 60601'),
+                         AddressFormat.ISSUE_BITS[
+                                 AddressFormat.UNKNOWN_SUFFIX])
+
+    def test_validate_many(self):
+        diagnostics = AddressFormat.Diagnostics()
+        previous = AddressFormat.set_diagnostics(diagnostics)
+        try:
+            self.assertEqual(list(AddressFormat.validate_many(
+                    ['1 Main St, Chicago IL 60601\r\n', '\n',
+                     '1 Main St, Chicago ZZ 60601\n'])),
+                    [0, AddressFormat.ISSUE_BITS[AddressFormat.UNPARSEABLE],
+                     AddressFormat.ISSUE_BITS[AddressFormat.UNKNOWN_STATE]])
+        finally:
+            AddressFormat.set_diagnostics(previous)
+        self.assertEqual(diagnostics.stats(), {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Behaviour tests of AddressJobs, run from the top of the repository with
+
+    python -m unittest discover
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+
+import AddressBenchmark
+import AddressFormat
+import AddressJobs
+
+class JobTest(unittest.TestCase):
+    '''A job stopped part way and run again, in stripes or whole,
+    merges into the output of a single run over its input.'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.job = os.path.join(self.directory, 'job')
+        self.input = os.path.join(self.directory, 'addresses.txt')
+        lines = [delivery_address+', '+last_line for delivery_address,
+                 last_line in AddressBenchmark.generate_addresses(400)]
+        lines[10:10] = ['NEW YORK 10001', '', '1 Main St, Chicago IL 6060']
+        with open(self.input, 'w') as input:
+            input.write('\n'.join(lines) + '\n')
+        output = StringIO()
+        with open(self.input, 'rU') as input:
+            AddressFormat.standardize_file(input, output, workers = 1)
+        self.expected = output.getvalue()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def create(self, shards = 8, partition = "zip3"):
+        with open(self.input, 'rU') as input:
+            return AddressJobs.create_job(input, self.job, shards, partition)
+
+    def merged(self):
+        output = StringIO()
+        records, failures = AddressJobs.merge_job(self.job, output)
+        self.assertEqual(records, 403)
+        self.assertEqual(failures, 2)
+        return output.getvalue()
+
+    def shard_path(self, number, extension):
+        return os.path.join(self.job, 'shard-%04d%s' % (number, extension))
+
+    def test_single_run(self):
+        for shards, partition in ((1, "zip3"), (8, "zip3"), (8, "hash")):
+            self.create(shards, partition)
+            self.assertEqual(AddressJobs.run_job(self.job, 1)[1:], (403, 2))
+            self.assertEqual(self.merged(), self.expected)
+            shutil.rmtree(self.job)
+
+    def test_resume(self):
+        manifest = self.create()
+        self.assertEqual(self.create(), manifest)
+        run, records, failures = AddressJobs.run_job(self.job, 1, (0, 2))
+        self.assertEqual(run, 4)
+        self.assertRaises(ValueError, AddressJobs.merge_job, self.job,
+                          StringIO())
+        # a shard which died while writing, and one which died after its
+        # output was renamed but before it was checkpointed
+        with open(self.shard_path(1, '.tmp'), 'w') as stale:
+            stale.write('0\tPART OF A RESULT')
+        with open(self.shard_path(3, '.out'), 'w') as stale:
+            stale.write('0\tA RESULT NEVER CHECKPOINTED\n')
+        done = self.shard_path(0, '.done')
+        checkpoint = os.stat(done).st_mtime, open(done).read()
+        self.assertEqual(AddressJobs.run_job(self.job, 2)[0], 4)
+        self.assertEqual((os.stat(done).st_mtime, open(done).read()),
+                         checkpoint)
+        self.assertFalse(os.path.exists(self.shard_path(1, '.tmp')))
+        self.assertEqual(AddressJobs.run_job(self.job, 1), (0, 0, 0))
+        self.assertEqual(self.merged(), self.expected)
+        self.assertEqual(self.merged(), self.expected)
+
+    def test_stripes(self):
+        output = os.path.join(self.directory, 'standardized.txt')
+        stderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            # the other stripes are not done yet, so nothing is merged
+            self.assertEqual(AddressJobs.main([self.input, '--job', self.job,
+                                               '-n', '8', '-j', '1',
+                                               '--stripe', '1/3',
+                                               '-o', output]), 1)
+            self.assertEqual(AddressJobs.main(['--job', self.job, '-j', '1',
+                                               '--stripe', '0/3']), 0)
+            self.assertFalse(os.path.exists(output))
+            self.assertEqual(AddressJobs.main(['--job', self.job, '-j', '1',
+                                               '--stripe', '2/3',
+                                               '-o', output]), 0)
+        finally:
+            sys.stderr = stderr
+        with open(output) as merged:
+            self.assertEqual(merged.read(), self.expected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+"""
+Behaviour tests of AddressServer, run from the top of the repository with
+
+    python -m unittest discover
+"""
+
+import unittest
+
+import AddressServer
+
+class ProcessTest(unittest.TestCase):
+    '''Every request is answered with its result or its own error.'''
+
+    def test_bad_requests(self):
+        for request, error in (({}, "No address given"),
+                               ({'address': '1 Main St, Chicago IL 60601',
+                                 'delimiter': 5},
+                                "Delimiter must be one ASCII character"),
+                               ({'address': '1 Main St, Chicago IL 60601',
+                                 'delimiter': ', '},
+                                "Delimiter must be one ASCII character"),
+                               ({'address': '1 Main St, Chicago IL 60601',
+                                 'delimiter': u'\xa7'},
+                                "Delimiter must be one ASCII character"),
+                               ({'address': '1 Main St, Chicago IL 60601',
+                                 'error_level': [1]},
+                                "Error level must be an integer")):
+            self.assertEqual(AddressServer.process('standardize', request),
+                             {'error': error})
+
+    def test_delimiter(self):
+        self.assertEqual(AddressServer.process('standardize',
+                {'address': u'1 Main St; Chicago IL 60601',
+                 'delimiter': u';'}),
+                {'result': '1 MAIN ST\nCHICAGO IL 60601', 'issues': []})
+
+class MicroBatcherTest(unittest.TestCase):
+    '''A batch answers each request as process() would, one failing
+    request leaving the others unchanged.'''
+
+    def setUp(self):
+        self.batcher = AddressServer.MicroBatcher()
+
+    def test_batch_matches_process(self):
+        requests = ['1 Main St, Chicago IL 60601', 'NEW YORK 10001', '',
+                    {'address': '2 Oak Ave, Chicago IL 6060'},
+                    {'address': '2 Oak Ave, Chicago IL 6060',
+                     'error_level': 1},
+                    {'address': '3 Elm St; Chicago, IL 60601',
+                     'delimiter': ';'},
+                    {'address': '3 Elm St, Chicago IL 60601\n'},
+                    {'address': '3 Elm St, Chicago IL 60601',
+                     'delimiter': [';']},
+                    None]
+        for part in sorted(AddressServer.PARTS):
+            self.assertEqual(self.batcher.submit_many(part, requests),
+                             [AddressServer.process(part, request)
+                              for request in requests])
+
+    def test_mixed_batch(self):
+        batch = [AddressServer._Pending('last_line', ['CHICAGO IL 60601',
+                                                      'CHICAGO']),
+                 AddressServer._Pending('delivery', ['1 Main Street']),
+                 AddressServer._Pending('breakdown', ['1 Main St'])]
+        self.batcher._process(batch)
+        self.assertEqual([pending.responses for pending in batch],
+                         [[{'result': 'CHICAGO IL 60601', 'issues': []},
+                           AddressServer.process('last_line', 'CHICAGO')],
+                          [{'result': '1 MAIN ST', 'issues': []}],
+                          [AddressServer.process('breakdown', '1 Main St')]])
+        self.assertTrue('error' in batch[0].responses[1])
+        self.assertTrue(all(pending.done.is_set() for pending in batch))
+
+if __name__ == '__main__':
+    unittest.main()